@@ -68,6 +68,10 @@ def main():
     
     # filer empty transcripts
     df = df.dropna(subset=['transcript'])
+
+    # skip near-duplicate transcripts flagged by transcript_csv (same problem explained again)
+    if 'duplicate_of' in df.columns:
+        df = df[df['duplicate_of'].isna()]
     
     # take sample
     df = df.sample(n=min(NUM_SAMPLES, len(df)), random_state=42)
@@ -25,6 +25,10 @@ def process_data():
     df_problems = pd.read_csv(LEETCODE_CSV)
     df_transcripts = pd.read_csv(TRANSCRIPT_CSV)
 
+    # drop near-duplicate transcripts flagged by transcript_csv, keep the canonical copy
+    if 'duplicate_of' in df_transcripts.columns:
+        df_transcripts = df_transcripts[df_transcripts['duplicate_of'].isna()]
+
     # clean columns
     cols_to_drop = [c for c in DROP_COLUMNS if c in df_problems.columns]
     df_problems = df_problems.drop(columns=cols_to_drop)
@@ -1,9 +1,6 @@
 import time
-import pandas as pd
 import os
-from tqdm import tqdm
-from google import genai
-from google.genai import types
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # load env
@@ -21,8 +18,11 @@ MODEL_A_ID = "projects/618518132754/locations/us-central1/endpoints/527574596162
 MODEL_B_NAME = "Gemini Flash (Baseline)"
 MODEL_B_ID = "gemini-2.0-flash-001"
 
-# Initialize Client
-client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+# Initialize Client (on first inference, not on import)
+@lru_cache(maxsize=None)
+def get_client():
+    from google import genai
+    return genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
 
 # --- 20 TEST CASES ---
 TEST_CASES = [
@@ -217,6 +217,8 @@ TEST_CASES = [
 ]
 
 def run_inference(model_id, test_case):
+    from google.genai import types
+
     # Mock system prompt
     system_text = f"""
     You are an expert Senior Staff Software Engineer conducting a mock technical interview.
@@ -233,7 +235,7 @@ def run_inference(model_id, test_case):
 
     start = time.time()
     try:
-        response = client.models.generate_content(
+        response = get_client().models.generate_content(
             model=model_id,
             contents=contents,
             config=types.GenerateContentConfig(
@@ -254,54 +256,62 @@ def run_inference(model_id, test_case):
         print(f"API Error for {model_id}: {e}") # Print error to see what's wrong!
         return f"ERROR: {str(e)}", 0
 
-results = []
-
-print(f"Benchmarking {len(TEST_CASES)} cases on {MODEL_A_NAME} vs {MODEL_B_NAME}...")
-
-for test in tqdm(TEST_CASES):
-    # 1. baseline model
-    base_resp, base_lat = run_inference(MODEL_B_ID, test)
-    
-    # 2. fine-tuned model
-    orbit_resp, orbit_lat = run_inference(MODEL_A_ID, test)
-
-    # 3. analyze code leakage
-    # does response contain python syntax usually indicative of giving the answer?
-    base_text = str(base_resp) if base_resp else ""
-    orbit_text = str(orbit_resp) if orbit_resp else ""
-
-    leaked_code_base = "```" in base_text or "def " in base_text or "return " in base_text
-    leaked_code_orbit = "```" in orbit_text or "def " in orbit_text or "return " in orbit_text
-
-    results.append({
-        "Problem": test['title'],
-        "Difficulty": test['diff'],
-        "Baseline Latency": round(base_lat, 3),
-        "Orbit Latency": round(orbit_lat, 3),
-        "Baseline Length (chars)": len(base_resp),
-        "Orbit Length (chars)": len(orbit_resp),
-        "Baseline Leaked Code?": leaked_code_base,
-        "Orbit Leaked Code?": leaked_code_orbit,
-        "Baseline Response": base_resp.replace("\n", " ")[:100] + "...",
-        "Orbit Response": orbit_resp.replace("\n", " ")[:100] + "..."
-    })
-    
-    # sleep briefly to avoid rate limits
-    time.sleep(0.5)
-
-# --- SAVE RESULTS ---
-df = pd.DataFrame(results)
-csv_filename = "orbit_vs_baseline_benchmark.csv"
-df.to_csv(csv_filename, index=False)
-
-print(f"\nBenchmark Complete! Saved to {csv_filename}")
-
-# --- SUMMARY STATISTICS ---
-print("\n=== SUMMARY REPORT ===")
-print(f"Total Runs: {len(df)}")
-print(f"Orbit Average Latency: {df['Orbit Latency'].mean():.3f}s")
-print(f"Baseline Average Latency: {df['Baseline Latency'].mean():.3f}s")
-print(f"Orbit Code Leakage Rate: {(df['Orbit Leaked Code?'].sum() / len(df)) * 100:.1f}%")
-print(f"Baseline Code Leakage Rate: {(df['Baseline Leaked Code?'].sum() / len(df)) * 100:.1f}%")
-print(f"Orbit Avg Length: {df['Orbit Length (chars)'].mean():.0f} chars")
-print(f"Baseline Avg Length: {df['Baseline Length (chars)'].mean():.0f} chars")
\ No newline at end of file
+def main():
+    import pandas as pd
+    from tqdm import tqdm
+
+    results = []
+
+    print(f"Benchmarking {len(TEST_CASES)} cases on {MODEL_A_NAME} vs {MODEL_B_NAME}...")
+
+    for test in tqdm(TEST_CASES):
+        # 1. baseline model
+        base_resp, base_lat = run_inference(MODEL_B_ID, test)
+
+        # 2. fine-tuned model
+        orbit_resp, orbit_lat = run_inference(MODEL_A_ID, test)
+
+        # 3. analyze code leakage
+        # does response contain python syntax usually indicative of giving the answer?
+        base_text = str(base_resp) if base_resp else ""
+        orbit_text = str(orbit_resp) if orbit_resp else ""
+
+        leaked_code_base = "```" in base_text or "def " in base_text or "return " in base_text
+        leaked_code_orbit = "```" in orbit_text or "def " in orbit_text or "return " in orbit_text
+
+        results.append({
+            "Problem": test['title'],
+            "Difficulty": test['diff'],
+            "Baseline Latency": round(base_lat, 3),
+            "Orbit Latency": round(orbit_lat, 3),
+            "Baseline Length (chars)": len(base_resp),
+            "Orbit Length (chars)": len(orbit_resp),
+            "Baseline Leaked Code?": leaked_code_base,
+            "Orbit Leaked Code?": leaked_code_orbit,
+            "Baseline Response": base_resp.replace("\n", " ")[:100] + "...",
+            "Orbit Response": orbit_resp.replace("\n", " ")[:100] + "..."
+        })
+
+        # sleep briefly to avoid rate limits
+        time.sleep(0.5)
+
+    # --- SAVE RESULTS ---
+    df = pd.DataFrame(results)
+    csv_filename = "orbit_vs_baseline_benchmark.csv"
+    df.to_csv(csv_filename, index=False)
+
+    print(f"\nBenchmark Complete! Saved to {csv_filename}")
+
+    # --- SUMMARY STATISTICS ---
+    print("\n=== SUMMARY REPORT ===")
+    print(f"Total Runs: {len(df)}")
+    print(f"Orbit Average Latency: {df['Orbit Latency'].mean():.3f}s")
+    print(f"Baseline Average Latency: {df['Baseline Latency'].mean():.3f}s")
+    print(f"Orbit Code Leakage Rate: {(df['Orbit Leaked Code?'].sum() / len(df)) * 100:.1f}%")
+    print(f"Baseline Code Leakage Rate: {(df['Baseline Leaked Code?'].sum() / len(df)) * 100:.1f}%")
+    print(f"Orbit Avg Length: {df['Orbit Length (chars)'].mean():.0f} chars")
+    print(f"Baseline Avg Length: {df['Baseline Length (chars)'].mean():.0f} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 ### """ File for calling google gemini Fine Tuned LLM to generate interview responses """###
-from google import genai
-from google.genai import types
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,12 +10,15 @@ PROJECT_ID = "618518132754"
 LOCATION = "us-central1"
 ENDPOINT_ID = "projects/618518132754/locations/us-central1/endpoints/5275745961627353088"
 
-# initialize client
-client = genai.Client(
-    vertexai=True,
-    project=PROJECT_ID,
-    location=LOCATION
-)
+# initialize client on first request (importing the app should not build it)
+@lru_cache(maxsize=None)
+def get_client():
+    from google import genai
+    return genai.Client(
+        vertexai=True,
+        project=PROJECT_ID,
+        location=LOCATION
+    )
 
 def generate_response(chat_history, current_user_code, problem_context):
     """
@@ -24,6 +26,8 @@ def generate_response(chat_history, current_user_code, problem_context):
     current_user_code: The Python code currently in the editor
     problem_context: The dict returned from problem_retriever.py
     """
+    from google.genai import types
+
     # --- 1. RAG CONTEXT SETUP ---
     rag_transcript = problem_context.get('transcript', '')[:10000]
     rag_solution = problem_context.get('solution_code', 'No solution provided.')
@@ -73,7 +77,7 @@ def generate_response(chat_history, current_user_code, problem_context):
 
     # 3. GENERATE
     try:
-        response = client.models.generate_content(
+        response = get_client().models.generate_content(
             model=ENDPOINT_ID,
             contents=contents,
             config=types.GenerateContentConfig(
@@ -1,25 +1,28 @@
-import boto3
 import os
+from functools import lru_cache
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Initialize DynamoDB Client
-dynamodb = boto3.resource(
-    'dynamodb',
-    region_name=os.getenv("AWS_REGION", "us-east-2")
-)
-
 TABLE_NAME = os.getenv("DYNAMODB_TABLE_NAME", "Orbit_Interview_Questions")
-table = dynamodb.Table(TABLE_NAME)
+
+# Initialize DynamoDB Client on first lookup
+@lru_cache(maxsize=None)
+def get_table():
+    import boto3
+    dynamodb = boto3.resource(
+        'dynamodb',
+        region_name=os.getenv("AWS_REGION", "us-east-2")
+    )
+    return dynamodb.Table(TABLE_NAME)
 
 def get_problem_context(problem_id: str):
     """
     Fetches the problem details, solution, and transcript hints from DynamoDB.
     """
     try:
-        response = table.get_item(Key={'problemId': problem_id})
+        response = get_table().get_item(Key={'problemId': problem_id})
         
         if 'Item' not in response:
             return None
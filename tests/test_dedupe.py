@@ -0,0 +1,37 @@
+from video_pipeline.domain.dedupe import find_near_duplicates, find_re_explanations
+
+TWO_SUM = """Today we are solving two sum. Given an array of integers nums and a target, return the
+indices of the two numbers that add up to the target. The brute force approach checks every pair
+with a nested loop, which is quadratic time. A better approach uses a hash map: as we iterate
+through the array we store each number and its index in the hash map, and for every element we
+compute the complement, target minus the current number. If the complement is already in the hash
+map we return its index together with the current index. This runs in linear time with linear
+extra space for the dictionary."""
+
+# the same explanation re-recorded in different words
+TWO_SUM_PARAPHRASE = """Alright so in this video I'll walk through the two sum problem. We get a
+list of integers called nums plus a target value, and we need the indices of two elements whose
+sum equals the target. The naive solution is a double loop over every pair, quadratic runtime.
+Instead we keep a dictionary, basically a hash map from number to index. For each element in the
+array we compute the complement, which is target minus the number, and check whether the
+complement is in the dictionary already. If so return both indices, otherwise store the current
+number and index. Linear time, linear space."""
+
+LEVEL_ORDER = """Let's do binary tree level order traversal. Given the root of a binary tree,
+return the level order traversal of its nodes values, from left to right, level by level. We use
+a queue for breadth first search. Start by pushing the root into the queue. While the queue is
+not empty, take the current queue length as the size of the level, pop that many nodes, append
+their values to a list for the level and push their left and right children. Append each level
+list to the result. Every node is visited once so the time is linear and the queue holds at most
+one level."""
+
+
+def test_reupload_is_a_near_duplicate():
+    docs = [("a", TWO_SUM), ("b", LEVEL_ORDER), ("c", "Hi everyone! " + TWO_SUM)]
+    assert find_near_duplicates(docs) == {"c": "a"}
+
+
+def test_paraphrase_is_flagged_as_re_explanation_only():
+    docs = [("a", TWO_SUM), ("b", LEVEL_ORDER), ("c", TWO_SUM_PARAPHRASE)]
+    assert find_near_duplicates(docs) == {}
+    assert find_re_explanations(docs) == {"c": "a"}
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parents[1]
+# env the modules would otherwise read on import
+UNSET = ("S3_BUCKET", "DDB_TABLE", "MANIFEST_PATH", "CONFIG_PATH", "LOG_PATH", "YOUTUBE_API_KEY")
+
+# module -> modules it must not load on import
+BUDGET = {
+    "video_pipeline.pipelines.ingest": ("boto3", "yt_dlp", "numpy"),
+    "video_pipeline.pipelines.discover": ("googleapiclient.discovery",),
+    "video_pipeline.pipelines.audio_transcriber": ("whisper", "torch"),
+    "video_pipeline.pipelines.generate_transcripts": ("whisper", "torch", "boto3"),
+    "src.llm_client": ("google.genai", "boto3"),
+    "src.problem_retriever": ("google.genai", "boto3"),
+    "src.benchmarking_evaluation": ("google.genai", "pandas", "tqdm"),
+}
+
+
+def run(tmp_path, args, **env):
+    base = {k: v for k, v in os.environ.items() if k not in UNSET}
+    return subprocess.run(
+        [sys.executable, *args], cwd=tmp_path, capture_output=True, text=True,
+        env={**base, "PYTHONPATH": os.pathsep.join([str(REPO), str(REPO / "LLM")]), **env},
+    )
+
+
+def import_module(tmp_path, module, heavy, **env):
+    """Import `module` in a fresh interpreter; returns (heavy modules it loaded, stdout)."""
+    code = (
+        "import io, json, sys, contextlib\n"
+        "out = io.StringIO()\n"
+        "with contextlib.redirect_stdout(out):\n"
+        f"    import {module}\n"
+        f"print(json.dumps([[m for m in {tuple(heavy)!r} if m in sys.modules], out.getvalue()]))\n"
+    )
+    proc = run(tmp_path, ["-c", code], **env)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout)
+
+
+@pytest.mark.parametrize("module", sorted(BUDGET))
+def test_import_is_cheap_and_side_effect_free(tmp_path, module):
+    loaded, printed = import_module(tmp_path, module, BUDGET[module])
+    assert loaded == []
+    # no work/, log file or benchmark output, and nothing printed (no paths, no benchmark run)
+    assert list(tmp_path.iterdir()) == []
+    assert printed == ""
+
+
+def test_ingest_import_with_unknown_codec_succeeds(tmp_path):
+    loaded, _ = import_module(tmp_path, "video_pipeline.pipelines.ingest", BUDGET["video_pipeline.pipelines.ingest"],
+                              AUDIO_CODEC="mp3")
+    assert loaded == []
+
+
+def test_ingest_main_rejects_unknown_codec(tmp_path):
+    proc = run(tmp_path, ["-m", "video_pipeline.pipelines.ingest", "--report"], AUDIO_CODEC="mp3")
+    assert proc.returncode == 2
+    assert "AUDIO_CODEC must be one of" in proc.stderr
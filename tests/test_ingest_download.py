@@ -0,0 +1,69 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import yt_dlp
+
+from video_pipeline.pipelines import ingest
+from video_pipeline.services.rate_limit import TokenBucket
+from video_pipeline.services.ytdlp import Downloader
+
+MEDIA = b"\x00\x00\x00\x18ftypmp42" + bytes(4096)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/media.mp4":
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(len(MEDIA)))
+            self.end_headers()
+            self.wfile.write(MEDIA)
+        else:  # auto-subs throttled
+            self.send_response(429)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_subtitle_failure_still_yields_media(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # the 429s penalize the token bucket; skip its cooldown
+    bucket = TokenBucket(tmp_path / "ratelimit.sqlite", rate=100, burst=100, cooldown_sec=0)
+    monkeypatch.setattr("video_pipeline.services.ytdlp.ytdlp_bucket", lambda: bucket)
+    monkeypatch.setattr(ingest, "TRACE", ingest.Trace(tmp_path / "trace.jsonl"))
+    info = {
+        "_type": "video", "id": "vid1", "title": "t", "duration": 1,
+        "extractor": "generic", "extractor_key": "Generic", "webpage_url": f"{server}/watch",
+        "formats": [{"format_id": "18", "url": f"{server}/media.mp4", "ext": "mp4",
+                     "acodec": "mp4a.40.2", "vcodec": "avc1"}],
+        "automatic_captions": {"en": [{"ext": "vtt", "url": f"{server}/subs.vtt"}]},
+    }
+    # stand-in for the YouTube extractor; the downloads themselves are real HTTP
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", lambda self, url, **kw: dict(info))
+    # the cookie fallback hits the same throttled subtitles, without browser cookies
+    monkeypatch.setattr(ingest, "SUBS_DL", Downloader(
+        skip_download=True, outtmpl=str(ingest.WORK / "%(id)s" / "source.%(ext)s"),
+        writesubtitles=True, writeautomaticsub=True, subtitleslangs=["en"],
+    ))
+
+    vdir = ingest.WORK / "vid1"
+    got = ingest.download_audio_any(f"{server}/watch", vdir)
+
+    assert got["id"] == "vid1"
+    assert (vdir / "source.mp4").read_bytes() == MEDIA
+    assert ingest.find_downloaded_audio(vdir) == vdir / "source.mp4"
+    assert not list(vdir.glob("*.vtt"))
@@ -0,0 +1,39 @@
+from video_pipeline.pipelines import ingest
+from video_pipeline.services.ddb import BatchWriter
+from video_pipeline.services.ledger import Ledger
+
+
+class FailingTable:
+    """boto3 Table stand-in whose BatchWriteItem calls always fail"""
+    name = "videos"
+
+    class meta:
+        class client:
+            @staticmethod
+            def batch_write_item(RequestItems):
+                raise RuntimeError("throttled")
+
+
+def test_failed_final_flush_feeds_the_retry_queue(tmp_path, monkeypatch):
+    writer = BatchWriter(FailingTable(), max_retries=0)
+    monkeypatch.setattr(ingest, "ddb_writer", lambda: writer)
+    monkeypatch.setattr(ingest, "_backoff", lambda i: None)
+    ledger = Ledger(tmp_path / "ledger.sqlite")
+    attempts = []
+
+    def run_round(queue):
+        # every video "finishes"; its DDB item is only buffered until the round's flush
+        for row in queue:
+            vid = row["video_id"]
+            attempts.append(vid)
+            ledger.mark_running(vid)
+            writer.put({"videoid": f"video#{vid}", "version": "meta#v0"},
+                       on_written=lambda vid=vid: ledger.mark_done(vid),
+                       on_failed=lambda e, vid=vid: ledger.mark_failed(vid, repr(e), 2))
+        return {"ok": list(queue), "locked": [], "failed": [], "dead": []}
+
+    results = ingest.ingest_batch([{"video_id": "a"}], ingest.flushed_rounds(run_round, ledger))
+
+    assert attempts == ["a", "a"]  # retried in a second round
+    assert results["ok"] == [] and results["dead"] == [{"video_id": "a"}]
+    assert ledger.get("a")["status"] == "dead"
@@ -0,0 +1,50 @@
+import os
+import shutil
+
+from video_pipeline.pipelines.audio_transcriber import find_audio
+from video_pipeline.services.workdir import WorkDirBudget, read_uploaded, record_uploaded
+
+
+class FakeS3:
+    """download_file from a local directory standing in for the bucket"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def download_file(self, Bucket, Key, Filename):
+        shutil.copyfile(self.root / Bucket / Key, Filename)
+
+
+def test_evicted_audio_is_restored_from_s3(tmp_path, monkeypatch):
+    work, bucket = tmp_path / "work", tmp_path / "s3"
+    vdir = work / "vid1"
+    vdir.mkdir(parents=True)
+    audio = vdir / "audio.flac"
+    audio.write_bytes(os.urandom(4096))
+
+    # "upload": the object is in the bucket and recorded in .uploaded.json
+    key = "yt/vid1/derived/audio.flac"
+    (bucket / "test-bucket" / key).parent.mkdir(parents=True)
+    shutil.copyfile(audio, bucket / "test-bucket" / key)
+    old = audio.stat().st_mtime - 3600
+    os.utime(audio, (old, old))
+    record_uploaded(vdir, [(audio, key)])
+
+    budget = WorkDirBudget(work, budget_bytes=0, min_bytes=0, min_age_sec=60, cas_root=tmp_path / "cas")
+    assert budget.enforce() == 4096
+    assert not audio.exists()
+    assert "evicted_at" in read_uploaded(vdir)["audio.flac"]
+
+    fake = FakeS3(bucket)
+    monkeypatch.setenv("S3_BUCKET", "test-bucket")
+    monkeypatch.setattr("boto3.client", lambda *a, **kw: fake)
+    assert find_audio(vdir) == audio
+    assert audio.read_bytes() == (bucket / "test-bucket" / key).read_bytes()
+
+    # the restored file matches its record again, so it stays evictable
+    rec = read_uploaded(vdir)["audio.flac"]
+    assert "evicted_at" not in rec and rec["size"] == 4096
+    old = audio.stat().st_mtime - 3600
+    os.utime(audio, (old, old))
+    record_uploaded(vdir, [(audio, key)])
+    assert budget.enforce() == 4096
@@ -0,0 +1,132 @@
+"""
+Near-Duplicate Transcripts:
+
+MinHash signatures over word shingles plus LSH banding, so re-uploads and re-explanations
+of the same problem are found without comparing every pair of transcripts.
+- shingles: lowercase word 5-grams, each hashed once to 64 bits
+- signature: NUM_PERM universal hashes (a*x + b mod 2^61-1) of every shingle, min per hash
+- LSH: BANDS bands of ROWS rows; transcripts sharing any band become candidates, which are
+  kept only if their estimated Jaccard similarity clears the threshold
+- two signals: find_near_duplicates (5-grams at 0.8) only catches near-verbatim re-uploads;
+  find_re_explanations compares the sets of content words (stopwords and filler dropped) at
+  a lower threshold, so a re-recorded explanation of the same problem in different phrasing
+  still matches. It is looser and can pair related problems, so it is a review flag, not a drop
+"""
+
+import random
+import re
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+WORD = re.compile(r"\w+")
+SHINGLE = 5
+NUM_PERM = 128
+BANDS, ROWS = 16, 8  # 16 * 8 = NUM_PERM; candidate curve is steepest near (1/16)^(1/8) ~ 0.71
+REVIEW_ROWS = 3  # 42 bands of 3 rows for the looser signal: steepest near (1/42)^(1/3) ~ 0.29
+REVIEW_THRESHOLD = 0.4
+# function words, spoken filler and words every walkthrough uses: they say nothing about the problem
+STOPWORDS = frozenset("""
+a about actually after again all alright already also am an and any are as at basically be because
+been before being but by called can could did do does doing don down each even every for from get
+given go going gonna got had has have here how i if in instead into is it its just know let lets
+like look me more my need no not now of off ok okay on one only or other otherwise our out over
+plus problem really return right say see so solution solve solving some something start take that
+the their them then there these they thing things think this those through to today too um uh up
+us use using very video walk want was way we well were what when where whether which while who
+why will with would yeah yes you your
+""".split())
+_PRIME = (1 << 61) - 1
+_MAX = (1 << 64) - 1
+
+_rng = random.Random(1)  # fixed seed: signatures must match across runs
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text: str, k: int = SHINGLE) -> set:
+    words = WORD.findall((text or "").lower())
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def _stem(word: str) -> str:
+    # crude suffix stripping, enough to line up "numbers"/"number" and "indexes"/"index"
+    for suffix in ("ing", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def content_words(text: str) -> set:
+    """Stemmed lowercase words that are not stopwords, numbers or single letters."""
+    return {_stem(w) for w in WORD.findall((text or "").lower())
+            if len(w) > 1 and not w.isdigit() and w not in STOPWORDS}
+
+
+def minhash(text: str, shingle=shingles) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of a transcript's `shingle(text)` set, or None when it is empty."""
+    hashed = [int.from_bytes(blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingle(text)]
+    if not hashed:
+        return None
+    return tuple(min((a * x + b) % _PRIME for x in hashed) for a, b in _PERMS)
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def find_near_duplicates(docs: Iterable[Tuple[str, str]], threshold: float = 0.8) -> Dict[str, str]:
+    """
+    docs: (doc_id, text) in priority order. Returns {duplicate_id: canonical_id}, where the
+    canonical doc of each cluster is the earliest one in `docs`.
+    """
+    return _cluster(docs, threshold, shingles, ROWS)
+
+
+def find_re_explanations(docs: Iterable[Tuple[str, str]], threshold: float = REVIEW_THRESHOLD) -> Dict[str, str]:
+    """
+    Like find_near_duplicates, but over content-word sets at a lower threshold: also matches
+    the same explanation in different words. Meant for review, not for dropping rows.
+    """
+    return _cluster(docs, threshold, content_words, REVIEW_ROWS)
+
+
+def _cluster(docs, threshold: float, shingle, rows: int) -> Dict[str, str]:
+    order: List[str] = []
+    sigs = {}
+    for doc_id, text in docs:
+        sig = minhash(text, shingle)
+        if sig is not None and doc_id not in sigs:
+            sigs[doc_id] = sig
+            order.append(doc_id)
+
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+    for doc_id in order:
+        sig = sigs[doc_id]
+        for band in range(NUM_PERM // rows):
+            buckets.setdefault((band, sig[band * rows:(band + 1) * rows]), []).append(doc_id)
+
+    # union-find keyed by position, so the root of each cluster is its earliest doc
+    rank = {doc_id: i for i, doc_id in enumerate(order)}
+    parent = list(range(len(order)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                if similarity(sigs[a], sigs[b]) >= threshold:
+                    ra, rb = root(rank[a]), root(rank[b])
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb)
+
+    return {doc_id: order[root(i)] for i, doc_id in enumerate(order) if root(i) != i}
@@ -3,10 +3,15 @@ Segments Functionality:
 
 We're trying to detect when code is being shown on screen by using keywords and symbols
 We score segments based on the density of these 
+- scorers are registered by version (SCORERS) and map a batch of utterance texts to scores
+- planning is split in two: score_utterances (the expensive part, cacheable per captions
+  file and scorer version) and merge_segments (threshold, merge, pad; cheap to rerun)
 """
 
 import re
-from typing import List, Dict
+from typing import Callable, List, Dict, Sequence
+
+import numpy as np
 
 CODE_KEYWORDS = re.compile(r'\b(def|class|return|for|while|if|else|elif|try|except|lambda|import|from|with|yield|static|public|void|int|long|bool|queue|stack|heap|graph|dp)\b', re.I)
 SYMBOLS = set('()[]{}:=;,.<>_+-/*|&%!`')
@@ -23,40 +28,192 @@ def score_code_likelihood(text: str) -> float:
 
     return score
 
-def plan_segments(utts: List[Dict], video_duration: float,
-                  thresh=0.55, min_len_sec=3.0, merge_gap_sec=3.0, pad_sec=4.0) -> List[Dict]:
-    hits = []
-    for u in utts:
-        s = score_code_likelihood(u["text"])
-        if s >= thresh:
-            hits.append({"t0": u["start"], "t1": u["end"], "score": s})
-
-    # merge by gap
-    merged = []
-    for h in sorted(hits, key=lambda x: x["t0"]):
-        if not merged:
-            merged.append(dict(h))
-            continue
-        last = merged[-1]
-        if h["t0"] <= last["t1"] + merge_gap_sec:
-            last["t1"] = max(last["t1"], h["t1"])
-            last["score"] = max(last["score"], h["score"])
-        else:
-            merged.append(dict(h))
+# ASCII lookup tables, indexed by code point: SYMBOLS membership, \w membership, lowercase
+_SYMBOL_TABLE = np.zeros(128, dtype=np.int64)
+_SYMBOL_TABLE[[ord(ch) for ch in SYMBOLS]] = 1
+_WORD_TABLE = np.array([chr(i).isascii() and (chr(i).isalnum() or chr(i) == "_") for i in range(128)])
+_LOWER_TABLE = np.array([ord(chr(i).lower()) for i in range(128)], dtype=np.uint64)
+# CODE_KEYWORDS alternatives (2-6 ASCII letters) packed little-endian into one integer each
+_KEYWORDS = CODE_KEYWORDS.pattern[CODE_KEYWORDS.pattern.index("(") + 1:CODE_KEYWORDS.pattern.index(")")].split("|")
+_KW_LEN = (min(map(len, _KEYWORDS)), max(map(len, _KEYWORDS)))
+_KW_PACKED = np.array(sorted(int.from_bytes(k.encode(), "little") for k in _KEYWORDS), dtype=np.uint64)
+
+def score_code_likelihood_batch(texts: Sequence[str]) -> List[float]:
+    """
+    score_code_likelihood for many texts at once (a video's utterances, or a whole corpus),
+    returning exactly the same floats
+    - texts are joined with "\n" into one buffer of UTF-32 code points, with each text's
+      offset kept; "\n" is not a word char, so no word runs across two texts
+    - symbols: lookup table over the code points, summed per text via cumulative sums
+    - keywords: \b(kw)\b matches exactly the maximal \w runs that equal a keyword, so word
+      runs are found from the ASCII word mask, lowercased, packed into integers and looked
+      up in the packed keyword set; texts with non-ASCII chars (other \w chars, case
+      folding such as K -> k) are counted with CODE_KEYWORDS itself
+    An Utterances (services.captions) is already laid out this way: its buffer and offsets
+    are used as they are.
+    """
+    if hasattr(texts, "buffer"):
+        joined, starts = texts.buffer, texts.offsets
+        lens = np.diff(starts) - 1
+    else:
+        texts = [t or "" for t in texts]
+        lens = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        starts = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lens + 1, out=starts[1:])  # + 1 for the separator
+        joined = "\n".join(texts)
+    n = len(lens)
+    if not n:
+        return []
+    ends = starts[:-1] + lens
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    ascii_ = codes < 128
+    idx = np.where(ascii_, codes, 0)
+
+    def per_text(mask):
+        csum = np.zeros(len(mask) + 1, dtype=np.int64)
+        np.cumsum(mask, out=csum[1:])
+        return csum[ends] - csum[starts[:-1]]
+
+    sym = per_text(_SYMBOL_TABLE[idx] * ascii_)
+
+    word = np.zeros(len(codes) + 2, dtype=np.int8)
+    word[1:-1] = _WORD_TABLE[idx] & ascii_
+    edges = np.diff(word)
+    run_start = np.flatnonzero(edges == 1)
+    run_len = np.flatnonzero(edges == -1) - run_start
+    keep = (run_len >= _KW_LEN[0]) & (run_len <= _KW_LEN[1])
+    run_start, run_len = run_start[keep], run_len[keep]
+    packed = np.zeros(len(run_start), dtype=np.uint64)
+    lower = _LOWER_TABLE[idx]
+    for j in range(_KW_LEN[1]):
+        inside = run_len > j
+        packed[inside] |= lower[run_start[inside] + j] << np.uint64(8 * j)
+    hits = run_start[np.isin(packed, _KW_PACKED)]
+    kw = np.bincount(np.searchsorted(starts, hits, side="right") - 1, minlength=n)
+    for i in np.flatnonzero(per_text(~ascii_)):
+        kw[i] = len(CODE_KEYWORDS.findall(texts[i]))
+
+    # same operations, in the same order, as score_code_likelihood
+    score = np.minimum(1.0, 0.2 * kw + 0.8 * (sym / np.maximum(1, lens)))
+    return score.tolist()
+
+Scorer = Callable[[Sequence[str]], List[float]]
+SCORERS: Dict[str, Scorer] = {}
+DEFAULT_SCORER = "heuristic_v1"
+
+def register_scorer(version: str):
+    """
+    Registers a batch scorer under `version`. The version is recorded with the segments and
+    keys the score cache, so a scorer whose output changes must get a new version.
+    """
+    def wrap(fn: Scorer) -> Scorer:
+        if version in SCORERS:
+            raise ValueError(f"Scorer {version!r} is already registered")
+        SCORERS[version] = fn
+        return fn
+    return wrap
+
+def get_scorer(version: str) -> Scorer:
+    try:
+        return SCORERS[version]
+    except KeyError:
+        raise ValueError(f"Unknown scorer {version!r}; registered: {sorted(SCORERS)}") from None
+
+register_scorer("heuristic_v1")(score_code_likelihood_batch)
+
+def score_utterances(utts, scorer: str = DEFAULT_SCORER) -> List[float]:
+    """utts: parse_vtt's list of dicts or an Utterances (passed to the scorer as is)"""
+    texts = [u["text"] for u in utts] if isinstance(utts, list) else utts
+    return get_scorer(scorer)(texts)
+
+def merge_intervals(starts, ends, scores, durations, thresh=0.55, min_len_sec=3.0,
+                    merge_gap_sec=3.0, pad_sec=4.0, video=None) -> Dict[str, np.ndarray]:
+    """
+    Vectorized threshold + merge + pad over one video's utterances or a whole corpus at once
+    (merge_segments is this for a single video, in its output format)
+
+    Args:
+        starts, ends, scores::array-like
+            Per-utterance times and scores (end >= start, as parse_vtt produces)
+        durations::array-like
+            Video duration per video index, 0 when unknown (segments are then not clamped)
+        video::array-like or None
+            Non-decreasing video index per utterance for corpus-wide arrays; hits never merge
+            across videos. None means a single video (index 0)
+
+    Returns:
+        Arrays over the kept segments: "video", "id" (1-based merge index within its video,
+        counted before the min_len_sec filter, like the seg_NNNN ids), "t0", "t1", "score"
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    video = np.zeros(len(starts), dtype=np.int64) if video is None else np.asarray(video, dtype=np.int64)
+
+    hit = scores >= thresh
+    video, t0, t1, score = video[hit], starts[hit], ends[hit], scores[hit]
+    order = np.lexsort((t0, video))  # stable: ties keep utterance order
+    video, t0, t1, score = video[order], t0[order], t1[order], score[order]
+    n = len(t0)
+    if n == 0:
+        return {"video": video, "id": video.copy(), "t0": t0, "t1": t1, "score": score}
+
+    # running max of t1 within each video: cummax of (video, rank of t1) as one integer key,
+    # which stays exact. Within a video, the running max of all earlier hits equals that of
+    # the current merged segment, since earlier segments end before it starts (end >= start).
+    by_t1 = np.argsort(t1, kind="stable")
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_t1] = np.arange(n)
+    running = t1[by_t1][np.maximum.accumulate(video * n + rank) - video * n]
+
+    new_seg = np.ones(n, dtype=bool)
+    new_seg[1:] = (video[1:] != video[:-1]) | (t0[1:] > running[:-1] + merge_gap_sec)
+    first = np.flatnonzero(new_seg)
+    seg_video = video[first]
+    seg_t1 = np.maximum.reduceat(t1, first)
+    seg_score = np.maximum.reduceat(score, first)
+    seg_id = np.arange(len(first)) - np.searchsorted(seg_video, seg_video, side="left") + 1
 
     # pad and filter by min length
-    out = []
-    for i, seg in enumerate(merged, 1):
-        t0 = max(0.0, seg["t0"] - pad_sec)
-        t1 = seg["t1"] + pad_sec
-        if video_duration:
-            t1 = min(video_duration, t1)
-        if (t1 - t0) >= min_len_sec:
-            out.append({
-                "id": f"seg_{i:04d}",
-                "t0": round(t0, 3),
-                "t1": round(t1, 3),
-                "score": round(seg["score"], 3),
-                "reason": "heuristic_v1"
-            })
-    return out
+    p0 = np.maximum(0.0, t0[first] - pad_sec)
+    p1 = seg_t1 + pad_sec
+    dur = durations[seg_video]
+    p1 = np.where(dur != 0, np.minimum(dur, p1), p1)
+    keep = (p1 - p0) >= min_len_sec
+    return {"video": seg_video[keep], "id": seg_id[keep], "t0": p0[keep], "t1": p1[keep], "score": seg_score[keep]}
+
+def merge_segments(starts: Sequence[float], ends: Sequence[float], scores: Sequence[float],
+                   video_duration: float, thresh=0.55, min_len_sec=3.0, merge_gap_sec=3.0,
+                   pad_sec=4.0, reason: str = DEFAULT_SCORER) -> List[Dict]:
+    """
+    Turns per-utterance scores (parallel to starts/ends) into segments: utterances scoring at
+    least `thresh` are merged across gaps up to `merge_gap_sec`, padded by `pad_sec`, clamped
+    to the video and kept if at least `min_len_sec` long
+    """
+    segs = merge_intervals(starts, ends, scores, [video_duration or 0.0], thresh=thresh,
+                           min_len_sec=min_len_sec, merge_gap_sec=merge_gap_sec, pad_sec=pad_sec)
+    return [
+        {
+            "id": f"seg_{i:04d}",
+            "t0": round(t0, 3),
+            "t1": round(t1, 3),
+            "score": round(score, 3),
+            "reason": reason
+        }
+        for i, t0, t1, score in zip(segs["id"].tolist(), segs["t0"].tolist(),
+                                    segs["t1"].tolist(), segs["score"].tolist())
+    ]
+
+def plan_segments(utts, video_duration: float,
+                  thresh=0.55, min_len_sec=3.0, merge_gap_sec=3.0, pad_sec=4.0,
+                  scorer: str = DEFAULT_SCORER) -> List[Dict]:
+    """utts: parse_vtt's list of dicts, or an Utterances (parse_vtt(..., as_arrays=True))"""
+    scores = score_utterances(utts, scorer)
+    if isinstance(utts, list):
+        starts, ends = [u["start"] for u in utts], [u["end"] for u in utts]
+    else:
+        starts, ends = utts.start, utts.end
+    return merge_segments(starts, ends, scores, video_duration,
+                          thresh=thresh, min_len_sec=min_len_sec, merge_gap_sec=merge_gap_sec,
+                          pad_sec=pad_sec, reason=scorer)
@@ -1,25 +1,59 @@
 """
 Fallback ASR using Whisper when captions are missing.
+whisper (and torch with it) is imported when a model is first needed, so caption-only runs
+never load it; the model is then reused for every video in the process.
 """
 
-import whisper
+from functools import lru_cache
 from pathlib import Path
 
+from video_pipeline.services import cache
+from video_pipeline.services.workdir import restore_evicted
+
+WHISPER_MODEL = "small"
+AUDIO_NAMES = ("audio.flac", "audio.opus", "audio.wav")  # ingest AUDIO_CODEC outputs
+
+
+def find_audio(work_dir: Path) -> Path | None:
+    for name in AUDIO_NAMES:
+        path = work_dir / name
+        if path.exists():
+            return path
+    # evicted by the ingest work-dir budget: fetch it back from S3
+    for name in AUDIO_NAMES:
+        path = restore_evicted(work_dir, name)
+        if path:
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def load_model(name: str = WHISPER_MODEL):
+    import whisper
+    print(f"Loading Whisper model ({name})...")
+    return whisper.load_model(name)
+
 
 def process_audio(video_id: str) -> str:
     work_dir = Path("work") / video_id
-    audio_file = work_dir / "audio.wav"
+    audio_file = find_audio(work_dir)
 
-    if not audio_file.exists() or audio_file.stat().st_size < 2000:
-        print(f"[{video_id}] No usable audio.wav found.")
+    if not audio_file or audio_file.stat().st_size < 2000:
+        print(f"[{video_id}] No usable derived audio found.")
         return ""
 
-    print(f"[{video_id}] Loading Whisper model (small)...")
-    model = whisper.load_model("small")
+    key = cache.cache_key("transcript_asr", cache.input_sha(audio_file, "content_sha"), model=WHISPER_MODEL)
+    text = cache.get_text(key)
+    if text is None:
+        model = load_model(WHISPER_MODEL)
 
-    print(f"[{video_id}] Transcribing audio...")
-    result = model.transcribe(str(audio_file), fp16=False)
-    text = result.get("text", "").strip()
+        # whisper decodes flac/opus/wav through ffmpeg on the fly, no temp wav needed
+        print(f"[{video_id}] Transcribing {audio_file.name}...")
+        result = model.transcribe(str(audio_file), fp16=False)
+        text = result.get("text", "").strip()
+        cache.put_text(key, text)
+    else:
+        print(f"[{video_id}] Using cached ASR transcript")
 
     out_file = work_dir / "transcript.txt"
     out_file.write_text(text, encoding="utf-8")
@@ -2,54 +2,18 @@
 Clean captions.norm.en.vtt into a natural transcript.
 """
 
-import re
 from pathlib import Path
 
-TIMESTAMP_RE = re.compile(r"^\d{1,2}:\d{2}(:\d{2})?\.\d{3}")  # 0:00.000 or 00:00:00.000
+from video_pipeline.services import cache
+from video_pipeline.services.captions import cues_to_transcript, iter_cues
 
+CLEANER_VERSION = "iter_cues_v1"  # part of the cache key: bump when the output changes
 
-def clean_vtt(vtt_path: str) -> str:
-    raw = Path(vtt_path).read_text(encoding="utf-8")
-    lines = raw.split("\n")
-
-    cleaned = []
-    last_line = None
-
-    # skip first 4 non-empty header lines
-    skip_count = 4
-    processed = []
-    for line in lines:
-        if line.strip():
-            if skip_count > 0:
-                skip_count -= 1
-                continue
-        processed.append(line)
-
-    for line in processed:
-        stripped = line.strip()
-        if not stripped:
-            continue
-
-        # timestamp lines
-        if TIMESTAMP_RE.match(stripped) or "-->" in stripped:
-            continue
 
-        # subtitle markup
-        if "<" in stripped or ">" in stripped:
-            continue
-
-        # must contain letters
-        if not re.search(r"[A-Za-z]", stripped):
-            continue
-
-        # dedupe consecutive lines
-        if stripped == last_line:
-            continue
-
-        cleaned.append(stripped)
-        last_line = stripped
+def clean_vtt(vtt_path: str) -> str:
+    # streamed cue by cue; tags stripped, consecutive repeated lines dropped
+    return cues_to_transcript(iter_cues(Path(vtt_path))).strip()
 
-    return " ".join(cleaned).strip()
 
 # find caption files to clean
 def process_caption(video_id: str) -> str:
@@ -60,8 +24,14 @@ def process_caption(video_id: str) -> str:
         print(f"[{video_id}] No captions found.")
         return ""
 
-    print(f"[{video_id}] Cleaning captions...")
-    transcript = clean_vtt(str(vtt_file))
+    key = cache.cache_key("transcript", cache.input_sha(vtt_file, "captions_norm_vtt_sha256"), cleaner=CLEANER_VERSION)
+    transcript = cache.get_text(key)
+    if transcript is None:
+        print(f"[{video_id}] Cleaning captions...")
+        transcript = clean_vtt(str(vtt_file))
+        cache.put_text(key, transcript)
+    else:
+        print(f"[{video_id}] Using cached transcript")
 
     out_file = work_dir / "transcript.txt"
     out_file.write_text(transcript, encoding="utf-8")
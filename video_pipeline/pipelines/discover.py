@@ -1,9 +1,35 @@
+"""
+Discover:
+
+Builds manifest.csv from the sources in channels.yml (playlists, and channels via their
+uploads playlist), incrementally from the last run.
+- discover_state.json keeps, per source, the first page ETag and the newest publishedAt seen;
+  an unchanged first page (HTTP 304) skips the source, and uploads playlists (newest first)
+  stop paging at the stored cursor
+- only videos not already in the manifest are appended, and they are also written to
+  manifest.delta.csv for downstream runs that only want the new work
+- sources are fetched in parallel, one API client per thread (httplib2 is not thread-safe)
+- new videos are enriched with videos.list (50 ids per call): duration, caption availability
+  and channel go into the manifest, and unavailable videos or ones outside the duration
+  limits are dropped before anything downloads them
+
+pipenv run python -m video_pipeline.pipelines.discover [--full]
+"""
+
 import os
+import re
 import csv
+import json
+import argparse
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
 import yaml
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError  # light; the discovery client is imported on first use
 from dotenv import load_dotenv
 from video_pipeline.utils.file_utils import to_abs_path
 
@@ -11,85 +37,282 @@ BASE_DIR = Path(__file__).resolve().parents[2]
 
 load_dotenv()
 
-CONFIG_ENV   = os.getenv("CONFIG_PATH")
-MANIFEST_ENV = os.getenv("MANIFEST_PATH")
-LOG_ENV      = os.getenv("LOG_PATH")
+DISCOVER_WORKERS = int(os.getenv("DISCOVER_WORKERS", "8"))
+MANIFEST_FIELDS = ["video_id", "title", "duration_sec", "has_captions", "channel_id", "channel_title"]
+ISO_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
 
-CONFIG_PATH   = to_abs_path(CONFIG_ENV, BASE_DIR)
-MANIFEST_PATH = to_abs_path(MANIFEST_ENV, BASE_DIR)
-LOG_PATH      = to_abs_path(LOG_ENV, BASE_DIR)
+log = logging.getLogger(__name__)
 
-print("Resolved paths:")
-print(CONFIG_PATH)
-print(MANIFEST_PATH)
-print(LOG_PATH)
+# Everything below is resolved on first use, so importing this module (tests, other
+# pipelines) needs no env, config file, log file or API client.
+class Paths(NamedTuple):
+    config: Path
+    manifest: Path
+    log: Path
+    state: Path
+    delta: Path
 
-logging.basicConfig(
-    filename=LOG_PATH,
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s: %(message)s"
-)
-log = logging.getLogger(__name__)
+@lru_cache(maxsize=None)
+def paths() -> Paths:
+    manifest = to_abs_path(os.environ["MANIFEST_PATH"], BASE_DIR)
+    return Paths(
+        config=to_abs_path(os.environ["CONFIG_PATH"], BASE_DIR),
+        manifest=manifest,
+        log=to_abs_path(os.environ["LOG_PATH"], BASE_DIR),
+        state=manifest.with_name("discover_state.json"),
+        delta=manifest.with_name("manifest.delta.csv"),
+    )
 
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-if not YOUTUBE_API_KEY:
-    raise ValueError("Missing YOUTUBE_API_KEY in environment!")
+@lru_cache(maxsize=None)
+def config() -> dict:
+    """channels.yml"""
+    with open(paths().config, "r") as f:
+        return yaml.safe_load(f)
 
-yt = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+@lru_cache(maxsize=None)
+def api_key() -> str:
+    key = os.getenv("YOUTUBE_API_KEY")
+    if not key:
+        raise ValueError("Missing YOUTUBE_API_KEY in environment!")
+    return key
 
-# load channel config
-with open(CONFIG_PATH, "r") as f:
-    cfg = yaml.safe_load(f)
+_local = threading.local()
 
-channels = cfg.get("sources", [])
-min_dur = cfg["limits"]["min_duration_sec"]
-max_dur = cfg["limits"]["max_duration_sec"]
+def client():
+    """YouTube API client for the current thread."""
+    if not hasattr(_local, "yt"):
+        from googleapiclient.discovery import build
+        _local.yt = build("youtube", "v3", developerKey=api_key(), cache_discovery=False)
+    return _local.yt
 
 # get videos
-def get_videos_from_playlist(playlist_id):
+def get_videos_from_playlist(playlist_id, etag=None, since=None, newest_first=False):
+    """
+    Page through a playlist. Returns (videos, first page ETag, newest publishedAt), or
+    None when the first page still matches `etag` (nothing changed since the last run).
+    Only items published to the playlist after `since` are returned; with `newest_first`
+    (uploads playlists) paging stops at the first older item.
+    """
     videos = []
     next_page = None
+    first_etag, cursor = None, since
 
     while True:
-        request = yt.playlistItems().list(
+        request = client().playlistItems().list(
             part="snippet,contentDetails",
             playlistId=playlist_id,
             maxResults=50,
             pageToken=next_page
         )
-        response = request.execute()
+        if etag and not next_page:
+            request.headers["If-None-Match"] = etag
+        try:
+            response = request.execute()
+        except HttpError as e:
+            if e.resp.status == 304:
+                return None
+            raise
+        if not next_page:
+            first_etag = response.get("etag")
 
+        reached_cursor = False
         for item in response["items"]:
+            published = item["snippet"].get("publishedAt", "")
+            if since and published <= since:
+                reached_cursor = True
+                continue
+            cursor = max(cursor or "", published)
             video_id = item["contentDetails"]["videoId"]
             title = item["snippet"]["title"]
             videos.append({"video_id": video_id, "title": title})
         next_page = response.get("nextPageToken")
-        if not next_page:
+        if not next_page or (newest_first and reached_cursor):
             break
 
-    return videos
+    return videos, first_etag, cursor
+
+def get_uploads_playlist(channel_id):
+    response = client().channels().list(part="contentDetails", id=channel_id).execute()
+    items = response.get("items", [])
+    if not items:
+        raise ValueError(f"Channel {channel_id} not found")
+    return items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+def keep_title(title, src):
+    t = title.lower()
+    include = [k.lower() for k in src.get("include_keywords") or []]
+    exclude = [k.lower() for k in src.get("exclude_keywords") or []]
+    if include and not any(k in t for k in include):
+        return False
+    return not any(k in t for k in exclude)
+
+def source_key(src):
+    return f"{src['type']}:{src['id']}"
+
+def discover_source(src, prev):
+    """New videos for one source since `prev` (its stored state) and the source's new state."""
+    prev = prev or {}
+    state = dict(prev)
+    if src["type"] == "channel":
+        playlist_id = prev.get("uploads") or get_uploads_playlist(src["id"])
+        state["uploads"] = playlist_id
+        newest_first = True
+    else:
+        playlist_id = src["id"]
+        newest_first = False
+
+    result = get_videos_from_playlist(playlist_id, prev.get("etag"), prev.get("cursor"), newest_first)
+    if result is None:
+        log.info(f"{source_key(src)} unchanged (etag)")
+        return [], state
+    videos, state["etag"], state["cursor"] = result
+    kept = [v for v in videos if keep_title(v["title"], src)]
+    log.info(f"{source_key(src)}: {len(videos)} new, {len(kept)} after keyword filters")
+    return kept, state
+
+def parse_duration(iso):
+    """ISO 8601 duration (PT1H2M3S) -> seconds; live/upcoming videos report P0D."""
+    m = ISO_DURATION.fullmatch(iso or "")
+    if not m:
+        return 0
+    d, h, mi, sec = (int(x or 0) for x in m.groups())
+    return ((d * 24 + h) * 60 + mi) * 60 + sec
+
+def get_video_details(video_ids):
+    """videos.list for up to 50 ids; ids missing from the response are private/deleted."""
+    response = client().videos().list(
+        part="contentDetails,snippet",
+        id=",".join(video_ids),
+        maxResults=50
+    ).execute()
+    details = {}
+    for item in response.get("items", []):
+        details[item["id"]] = {
+            "duration_sec": parse_duration(item["contentDetails"].get("duration")),
+            "has_captions": item["contentDetails"].get("caption") == "true",
+            "channel_id": item["snippet"].get("channelId"),
+            "channel_title": item["snippet"].get("channelTitle"),
+        }
+    return details
+
+def enrich(entries):
+    """
+    Fill duration/captions/channel for rows that lack them (batches of 50 ids, in parallel),
+    then drop unavailable videos and those outside limits.min/max_duration_sec.
+    """
+    todo = [e["video_id"] for e in entries if not e.get("duration_sec")]
+    batches = [todo[i:i + 50] for i in range(0, len(todo), 50)]
+    details = {}
+    with ThreadPoolExecutor(max_workers=DISCOVER_WORKERS) as pool:
+        for batch in pool.map(get_video_details, batches):
+            details.update(batch)
+
+    limits = config()["limits"]
+    min_dur, max_dur = limits["min_duration_sec"], limits["max_duration_sec"]
+    kept, dropped = [], Counter()
+    for e in entries:
+        if not e.get("duration_sec"):
+            if e["video_id"] not in details:
+                dropped["unavailable"] += 1
+                continue
+            e.update(details[e["video_id"]])
+        dur = int(e["duration_sec"])
+        if dur < min_dur:
+            dropped["too_short"] += 1
+        elif dur > max_dur:
+            dropped["too_long"] += 1
+        else:
+            kept.append(e)
+    if dropped:
+        log.info(f"Dropped videos: {dict(dropped)}")
+        print(f"Dropped videos: {dict(dropped)}")
+    return kept
+
+def load_state():
+    if paths().state.exists():
+        return json.loads(paths().state.read_text())
+    return {}
+
+def save_state(state):
+    tmp = paths().state.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, paths().state)
+
+def read_manifest():
+    if not paths().manifest.exists():
+        return []
+    with open(paths().manifest, newline="") as f:
+        return list(csv.DictReader(f))
 
 # write to manifest.csv, video_id, title
 def write_manifest(entries):
-    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(MANIFEST_PATH, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["video_id", "title"])
+    # a video can sit in several playlists: keep its first occurrence only
+    seen = set()
+    unique = []
+    for e in entries:
+        if e["video_id"] not in seen:
+            seen.add(e["video_id"])
+            unique.append(e)
+    if len(unique) < len(entries):
+        log.info(f"Dropped {len(entries) - len(unique)} duplicate video ids")
+    entries = unique
+
+    paths().manifest.parent.mkdir(parents=True, exist_ok=True)
+    with open(paths().manifest, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS, restval="", extrasaction="ignore")
         writer.writeheader()
         writer.writerows(entries)
 
     log.info(f"Wrote manifest with {len(entries)} videos")
+    return entries
+
+
+def write_delta(entries):
+    with open(paths().delta, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS, restval="", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(entries)
 
 
 def main():
-    all_videos = []
+    parser = argparse.ArgumentParser(prog="discover")
+    parser.add_argument("--full", help="Ignore the saved state and rebuild the manifest from scratch", action="store_true")
+    args = parser.parse_args()
+
+    print("Resolved paths:")
+    print(paths().config)
+    print(paths().manifest)
+    print(paths().log)
+
+    logging.basicConfig(
+        filename=paths().log,
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s: %(message)s"
+    )
+
+    sources = [src for src in config().get("sources", []) if src["type"] in ("playlist", "channel")]
+    state = {} if args.full else load_state()
+    existing = [] if args.full else read_manifest()
+    known = {row["video_id"] for row in existing}
+
+    with ThreadPoolExecutor(max_workers=DISCOVER_WORKERS) as pool:
+        results = list(pool.map(lambda src: discover_source(src, state.get(source_key(src))), sources))
 
-    for src in channels:
-        if src["type"] == "playlist":
-            vids = get_videos_from_playlist(src["id"])
-            all_videos.extend(vids)
+    new_videos = []
+    for src, (videos, src_state) in zip(sources, results):
+        state[source_key(src)] = src_state
+        new_videos.extend(v for v in videos if v["video_id"] not in known)
 
-    write_manifest(all_videos)
-    print(f"Saved {len(all_videos)} videos to manifest.csv")
+    # rows from manifests written before enrichment get their details backfilled here
+    existing = enrich(existing)
+    new_videos = enrich(new_videos)
+    entries = write_manifest(existing + new_videos)
+    # by id, not position: write_manifest dedupes, so the first len(existing) rows need not be the old ones
+    delta = [e for e in entries if e["video_id"] not in known]
+    write_delta(delta)
+    # state only advances once the manifest holds everything it points past
+    save_state(state)
+    print(f"Saved {len(entries)} videos to manifest.csv, {len(delta)} new in {paths().delta.name}")
 
 if __name__ == "__main__":
     main()
@@ -26,9 +26,16 @@ from pathlib import Path
 from typing import Optional
 
 from video_pipeline.services.ddb import read_segments
+from video_pipeline.services.ytdlp import Downloader
 
 WORK = Path("work")
 
+# Simple, robust mp4 download – no need for super fancy formats for frame extraction
+VIDEO_DL = Downloader(
+    format="bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/best",
+    outtmpl=str(WORK / "%(id)s" / "video.mp4"),
+)
+
 
 def run(cmd: str) -> None:
     """Utility to run a shell command and echo it."""
@@ -55,13 +62,8 @@ def ensure_video_downloaded(video_id: str) -> Path:
         return video_path
 
     url = f"https://www.youtube.com/watch?v={video_id}"
-    # Simple, robust mp4 download – no need for super fancy formats for frame extraction
-    cmd = (
-        'yt-dlp '
-        '-f "bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/best" '
-        f'-o "{video_path}" "{url}"'
-    )
-    run(cmd)
+    print(f"\n[{video_id}] yt-dlp {url}")
+    VIDEO_DL.fetch(url)
 
     if not video_path.exists():
         raise RuntimeError(f"Expected {video_path} to exist after download")
@@ -10,6 +10,7 @@ Logic:
 from pathlib import Path
 from .caption_cleaner import process_caption
 from .audio_transcriber import process_audio
+from video_pipeline.services.workdir import restore_evicted
 
 
 def generate_transcripts(video_id: str = None):
@@ -20,7 +21,8 @@ def generate_transcripts(video_id: str = None):
     if video_id:
         video_dirs = [work_dir / video_id]
     else:
-        video_dirs = [d for d in work_dir.iterdir() if d.is_dir()]
+        # skip work/.cas and other hidden bookkeeping dirs
+        video_dirs = [d for d in work_dir.iterdir() if d.is_dir() and not d.name.startswith(".")]
 
     print(f"Processing {len(video_dirs)} videos...\n")
 
@@ -31,8 +33,8 @@ def generate_transcripts(video_id: str = None):
 
         transcript = ""
 
-        # 1 — try captions first
-        if (vd / "captions.norm.en.vtt").exists():
+        # 1 — try captions first (fetched back from S3 if the work-dir budget evicted them)
+        if restore_evicted(vd, "captions.norm.en.vtt"):
             transcript = process_caption(vid)
 
         # 2 — if captions empty or missing --> audio
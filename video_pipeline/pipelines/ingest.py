@@ -1,54 +1,132 @@
-import csv, json, os, pathlib, subprocess, hashlib, time, sys, argparse
-import shlex, subprocess, random
-import boto3
+import csv, json, os, pathlib, subprocess, hashlib, time, sys, argparse, struct
+import asyncio, subprocess, random, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import lru_cache, partial
 from botocore.exceptions import ClientError
 
+from video_pipeline.services import cache
+from video_pipeline.services.ddb import BatchWriter
+from video_pipeline.services.ledger import DEAD, FAILED, Ledger
+from video_pipeline.services.s3 import MultipartStream, PrefixIndex, transfer_config
+from video_pipeline.services.workdir import WorkDirBudget, record_uploaded
+from video_pipeline.services.ytdlp import Downloader, DownloadError, cookie_params, probe_from_info
+from video_pipeline.utils.file_utils import dir_lock, sha256_of
+from video_pipeline.utils.timing import Trace, report
+
 # Environment
-S3_BUCKET   = os.environ["S3_BUCKET"]
-DDB_TABLE   = os.environ["DDB_TABLE"]
+# S3_BUCKET / DDB_TABLE are required, but only checked when their client is first built
+S3_BUCKET   = os.environ.get("S3_BUCKET")
+DDB_TABLE   = os.environ.get("DDB_TABLE")
 AWS_REGION  = os.environ.get("AWS_REGION", "us-east-1")
-MANIFEST_PATH = pathlib.Path(os.environ.get("MANIFEST_PATH"))
+MANIFEST_PATH = pathlib.Path(os.environ["MANIFEST_PATH"]) if os.environ.get("MANIFEST_PATH") else None
 KEEP_SOURCE = os.environ.get("KEEP_SOURCE", "false").lower() == "true"  # "keep original audio file"
 PROCESSING_VERSION = os.environ.get("PROCESSING_VERSION", "v0.1.0")
 CAPTION_LANGS = os.environ.get("CAPTION_LANGS", "en.*")  # comma pattern for yt-dlp
-
-WORK = pathlib.Path("work")
-WORK.mkdir(exist_ok=True, parents=True)
-
-s3  = boto3.client("s3", region_name=AWS_REGION)
-ddb = boto3.resource("dynamodb", region_name=AWS_REGION).Table(DDB_TABLE)
-
-def run(cmd: str):
-    subprocess.check_call(cmd, shell=True)
-
-def sha256_of(path: pathlib.Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1<<20), b""):
-            h.update(chunk)
-    return h.hexdigest()
+SINGLE_PASS = os.environ.get("SINGLE_PASS_TRANSCODE", "false").lower() == "true"  # ffmpeg -> pipe -> hash/file/S3
+STREAM_AUDIO_UPLOAD = os.environ.get("STREAM_AUDIO_UPLOAD", "false").lower() == "true"  # only with SINGLE_PASS
+AUDIO_CODEC = os.environ.get("AUDIO_CODEC", "flac").lower()  # derived audio: flac (lossless) | opus | wav
+
+# 16 kHz mono derived audio, per codec
+AUDIO_CODECS = {
+    "flac": {"ext": "flac", "format": "flac", "content_type": "audio/flac",
+             "args": ["-acodec", "flac", "-compression_level", "8"]},
+    "opus": {"ext": "opus", "format": "ogg", "content_type": "audio/ogg",
+             "args": ["-acodec", "libopus", "-b:a", "24k", "-application", "voip"]},
+    "wav":  {"ext": "wav", "format": "wav", "content_type": "audio/wav",
+             "args": ["-acodec", "pcm_s16le"]},
+}
+# an unknown codec is rejected by main(), so importing ingest for its helpers never fails
+AUDIO = AUDIO_CODECS.get(AUDIO_CODEC)
+AUDIO_NAME = f"audio.{AUDIO['ext']}" if AUDIO else None
+AUDIO_HASH_FIELD = f"audio_{AUDIO_CODEC}_sha256"
+
+WORK = pathlib.Path("work")  # created by main() / new_job, not on import
+LEDGER_PATH = WORK / "ingest_ledger.sqlite"
+TRACE_PATH = pathlib.Path(os.environ.get("INGEST_TRACE_PATH", WORK / "ingest_trace.jsonl"))
+TRACE = Trace(TRACE_PATH)
+
+_upload_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("S3_UPLOAD_WORKERS", "8")))
+_hash_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("SOURCE_HASH_WORKERS", "2")))
+_s3_index = None
+_s3_index_lock = threading.Lock()
+
+def _require(name: str) -> str:
+    value = os.environ.get(name)
+    if not value:
+        raise KeyError(f"{name} must be set")
+    return value
+
+# boto3 clients are built (and boto3 imported) on first use, so importing ingest for its
+# helpers, --report or ingest_async does not pay for them
+@lru_cache(maxsize=None)
+def s3_client():
+    _require("S3_BUCKET")
+    import boto3
+    return boto3.client("s3", region_name=AWS_REGION)
+
+@lru_cache(maxsize=None)
+def _transfer_config():
+    return transfer_config()
+
+@lru_cache(maxsize=None)
+def ddb_writer() -> BatchWriter:
+    """Shared batched writer for the videos table; flushed when main's `with` block exits."""
+    import boto3
+    table = boto3.resource("dynamodb", region_name=AWS_REGION).Table(_require("DDB_TABLE"))
+    return BatchWriter(table, trace=TRACE)
 
 def s3_key(video_id: str, rel: str) -> str:
     return f"yt/{video_id}/{rel}"
 
+def s3_index() -> PrefixIndex:
+    """Per-run listing of everything under yt/ (built on first use, shared by all workers)."""
+    global _s3_index
+    with _s3_index_lock:
+        if _s3_index is None:
+            _s3_index = PrefixIndex(s3_client(), S3_BUCKET, "yt/")
+            print(f"S3 index: {len(_s3_index)} objects under s3://{S3_BUCKET}/yt/")
+    return _s3_index
+
 def s3_exists(key: str) -> bool:
+    return key in s3_index()
+
+def remote_hashes(video_id: str) -> dict:
+    """hashes.json as last published to S3, or {} if there is none."""
+    key = s3_key(video_id, "hashes.json")
+    if not s3_exists(key):
+        return {}
     try:
-        s3.head_object(Bucket=S3_BUCKET, Key=key)
-        return True
-    except ClientError:
-        return False
+        return json.loads(s3_client().get_object(Bucket=S3_BUCKET, Key=key)["Body"].read())
+    except (ClientError, ValueError):
+        return {}
 
-def upload_file(path: pathlib.Path, key: str, content_type: str):
+def upload_file(path: pathlib.Path, key: str, content_type: str, force: bool = False, stage: str | None = None):
+    """
+    Upload unless the object is already in the S3 index; `force` re-uploads changed content.
+    Traced as "upload:<stage>", by default the key under yt/<video_id>/.
+    """
     if not path or not path.exists():
         return
-    if s3_exists(key):
+    if s3_exists(key) and not force:
         return
-    s3.upload_file(
-        Filename=str(path),
-        Bucket=S3_BUCKET,
-        Key=key,
-        ExtraArgs={"ContentType": content_type}
-    )
+    size = path.stat().st_size
+    _, video_id, rel = key.split("/", 2)
+    with TRACE.stage(video_id, f"upload:{stage or rel}", size):
+        s3_client().upload_file(
+            Filename=str(path),
+            Bucket=S3_BUCKET,
+            Key=key,
+            ExtraArgs={"ContentType": content_type},
+            Config=_transfer_config(),
+        )
+    s3_index().add(key, size)
+
+def upload_all(uploads):
+    """Run upload_file(*args) for each entry concurrently and wait for all of them."""
+    futures = [_upload_pool.submit(upload_file, *args) for args in uploads]
+    for fut in futures:
+        fut.result()
 
 def pick_best_caption(raw_dir: pathlib.Path):
     # Prefer human en* first, else auto en*; yt-dlp may name files variably.
@@ -64,126 +142,333 @@ def find_downloaded_audio(vdir: pathlib.Path) -> pathlib.Path | None:
         p = vdir / f"source{ext}"
         if p.exists():
             return p
-    # Fallback: first non-json/non-vtt file
+    # Fallback: first non-json/non-vtt file that is not an unfinished download
     for p in sorted(vdir.iterdir()):
-        if p.suffix.lower() not in {".json", ".vtt"} and p.is_file():
+        if p.suffix.lower() not in {".json", ".vtt", ".part", ".ytdl"} and not p.name.startswith(".") and p.is_file():
             return p
     return None
 
-def _sh(cmd: str):
-    subprocess.check_call(cmd, shell=True)
+def _sh(cmd: list[str]):
+    subprocess.check_call(cmd)
 
 def _backoff(i: int):
     time.sleep((2 ** i) * 0.5 + random.random() * 0.25)
 
-def download_audio_any(url: str, vdir: pathlib.Path, caption_langs: str):
+# One extraction per video serves media, info json and (usually) subtitles.
+# Templates are relative to WORK so every video shares the same per-thread YoutubeDL.
+# Subtitles are a separate best-effort pass over the same info dict: yt-dlp raises on a
+# subtitle error (e.g. a 429 on auto-subs) unless ignoreerrors=True, which would fail the media.
+MEDIA_DL = Downloader(
+    format="18/best",  # prefer progressive MP4 360p; fallback to anything playable
+    outtmpl=str(WORK / "%(id)s" / "source.%(ext)s"),
+    extractor_args={"youtube": {"player_client": ["android"]}},
+    source_address="0.0.0.0",  # force IPv4
+    writeinfojson=True, check_formats=True,  # keep .part files: a truncated download never looks finished
+    retries=10, fragment_retries=10, concurrent_fragment_downloads=1,
+    ignoreerrors="only_download",
+)
+CAPTIONS_DL = Downloader(
+    skip_download=True,
+    outtmpl=str(WORK / "%(id)s" / "source.%(ext)s"),
+    writesubtitles=True, writeautomaticsub=True, subtitleslangs=CAPTION_LANGS.split(","),
+)
+# Fallback for gated captions: web client + cookies, subtitles only
+SUBS_DL = Downloader(
+    skip_download=True,
+    outtmpl=str(WORK / "%(id)s" / "source.%(ext)s"),
+    extractor_args={"youtube": {"player_client": ["web_creator"]}},
+    source_address="0.0.0.0",
+    writesubtitles=True, writeautomaticsub=True, subtitleslangs=CAPTION_LANGS.split(","),
+    **cookie_params(os.getenv("YTDLP_COOKIES_FILE"), os.getenv("YTDLP_COOKIES_FROM_BROWSER", "chrome")),
+)
+
+def ffprobe_cmd(src: pathlib.Path) -> list[str]:
+    return ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", str(src)]
+
+def ffmpeg_cmd(src: pathlib.Path, dst: pathlib.Path | str) -> list[str]:
+    # dst may be "pipe:1"; the explicit -f keeps the container independent of the extension
+    return ["ffmpeg", "-y", "-i", str(src), "-ac", "1", "-ar", "16000", "-vn",
+            *AUDIO["args"], "-f", AUDIO["format"], str(dst)]
+
+def ffmpeg_pcm_cmd(src: pathlib.Path) -> list[str]:
+    # same audio as ffmpeg_cmd with AUDIO_CODEC=wav, but raw samples on stdout so we can tee them
+    return ["ffmpeg", "-v", "error", "-i", str(src), "-ac", "1", "-ar", "16000", "-vn",
+            "-acodec", "pcm_s16le", "-f", "s16le", "pipe:1"]
+
+def wav_header(data_len: int, rate: int = 16000, channels: int = 1, bits: int = 16) -> bytes:
+    """Canonical 44-byte PCM WAV header for `data_len` bytes of samples."""
+    block = channels * bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_len, b"WAVE",
+        b"fmt ", 16, 1, channels, rate, rate * block, block, bits,
+        b"data", data_len,
+    )
+
+def download_audio_any(url: str, vdir: pathlib.Path) -> dict:
     """
-    Robust media+subs:
+    Robust media+subs from one in-process extraction (services.ytdlp):
       - MEDIA: Android client (no cookies), prefer progressive 18; fallback to best.
-      - SUBTITLES: Web client with cookies, best-effort (won't fail job).
+      - SUBTITLES: from the same info dict (no second extraction); if that yields no .vtt,
+        one web-client pass with cookies. Both best-effort (won't fail job).
+    Returns the yt-dlp info dict.
     """
     vdir.mkdir(parents=True, exist_ok=True)
 
-    # --- MEDIA: android client, NO cookies ---
-    media_cmd = (
-        'yt-dlp '
-        '--extractor-args "youtube:player_client=android" '
-        '--force-ipv4 '
-        '--no-part --write-info-json --check-formats '
-        '--retries 10 --fragment-retries 10 --sleep-requests 1 --concurrent-fragments 1 '
-        '-f "18/best" '  # prefer progressive MP4 360p; fallback to anything playable
-        f'-o "{vdir}/source.%(ext)s" '
-        f'{shlex.quote(url)}'
-    )
     # Try twice with small backoff
-    for i in range(2):
-        try:
-            _sh(media_cmd)
+    with TRACE.stage(vdir.name, "download_media") as rec:
+        for i in range(2):
+            try:
+                # a failed media download raises from fetch even though yt-dlp only logs it
+                info = MEDIA_DL.fetch(url)
+                if not find_downloaded_audio(vdir):
+                    raise DownloadError(f"no media written for {url}")
+                break
+            except DownloadError:
+                if i == 1:
+                    raise
+                _backoff(i)
+        rec["bytes"] = media_bytes(vdir)
+
+    for name, fetch_subs in (("download_subs", lambda: CAPTIONS_DL.process(info)),
+                             ("download_subs_web", lambda: SUBS_DL.fetch(url))):
+        if vtt_bytes(vdir):
             break
-        except subprocess.CalledProcessError as e:
-            if i == 1:
-                raise
-            _backoff(i)
-
-    # --- SUBTITLES: web client + cookies (best effort) ---
-    # Choose cookies: explicit cookies.txt beats browser extraction
-    if os.getenv("YTDLP_COOKIES_FILE"):
-        cookies_flag = f'--cookies "{os.environ["YTDLP_COOKIES_FILE"]}" '
-    else:
-        cookies_flag = f'--cookies-from-browser {os.getenv("YTDLP_COOKIES_FROM_BROWSER","chrome")} '
-
-    subs_cmd = (
-        'yt-dlp --skip-download '
-        f'{cookies_flag}'
-        '--extractor-args "youtube:player_client=web_creator" '
-        '--force-ipv4 '
-        f'--write-subs --write-auto-subs --sub-langs "{caption_langs}" '
-        f'-o "{vdir}/source.%(ext)s" '
-        f'{shlex.quote(url)}'
-    )
-    try:
-        _sh(subs_cmd)
-    except subprocess.CalledProcessError:
-        # No subs or gated: proceed without captions
-        pass
+        try:
+            with TRACE.stage(vdir.name, name) as rec:
+                fetch_subs()
+                rec["bytes"] = vtt_bytes(vdir)
+        except DownloadError as e:
+            # No subs, throttled or gated: proceed without captions
+            print(f"[{vdir.name}] subtitles: {e}", file=sys.stderr)
+    return info
+
+def media_bytes(vdir: pathlib.Path) -> int | None:
+    src = find_downloaded_audio(vdir)
+    return src.stat().st_size if src else None
 
+def vtt_bytes(vdir: pathlib.Path) -> int:
+    return sum(p.stat().st_size for p in vdir.glob("*.vtt"))
 
 
-def ingest_one(video_id: str, title: str):
-    url  = f"https://www.youtube.com/watch?v={video_id}"
+def new_job(video_id: str, title: str, on_written=None, on_failed=None) -> dict:
+    """
+    `on_written` is called once the video's DDB item has actually been flushed,
+    `on_failed(exc)` if the batch carrying it could not be written.
+    """
     vdir = WORK / video_id
     vdir.mkdir(parents=True, exist_ok=True)
+    return {
+        "video_id": video_id,
+        "title": title,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "vdir": vdir,
+        "on_written": on_written,
+        "on_failed": on_failed,
+    }
 
-    # 1) MEDIA via Android (no cookies), captions via web+cookies (best-effort)
-    download_audio_any(url, vdir, CAPTION_LANGS)
-
-    # 2) Read info json (guard)
+def locate_media(job: dict) -> bool:
+    """
+    Stage 1 tail (after download): read info json and find the downloaded media.
+    Records a download_failed item and returns False when there is nothing to process.
+    """
+    vdir = job["vdir"]
     info_json = vdir / "source.info.json"
-    meta = json.loads(info_json.read_text()) if info_json.exists() else {}
+    job["info_json"] = info_json
+    job["meta"] = json.loads(info_json.read_text()) if info_json.exists() else {}
 
-    # 3) Locate downloaded media (progressive mp4, m4a, webm, etc.)
+    # Locate downloaded media (progressive mp4, m4a, webm, etc.)
     audio_src = find_downloaded_audio(vdir)
     if not audio_src or not audio_src.exists():
         now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        ddb.put_item(Item={
-            "PK": f"video#{video_id}",
-            "SK": "meta#v0",
-            "video_id": video_id,
-            "title": title,
-            "url": url,
+        ddb_writer().put({
+            "videoid": f"video#{job['video_id']}",
+            "version": "meta#v0",
+            "video_id": job["video_id"],
+            "title": job["title"],
+            "url": job["url"],
             "status": "download_failed",
             "ingested_at": now_iso,
             "processing_version": PROCESSING_VERSION,
             "error": "no_playable_media_after_android",
-        })
-        return
-
-    # 4) ffprobe
-    ffprobe_path = vdir / "ffprobe.json"
-    run(f'ffprobe -v quiet -print_format json -show_format -show_streams "{audio_src}" > "{ffprobe_path}"')
+        }, on_written=job.get("on_written"), on_failed=job.get("on_failed"))
+        return False
+    job["audio_src"] = audio_src
+    return True
 
-    # 5) Normalize captions -> captions.norm.en.vtt
+def normalize_captions(job: dict):
+    # Normalize captions -> captions.norm.en.vtt
+    vdir = job["vdir"]
     captions_best = pick_best_caption(vdir)
     captions_norm = None
     if captions_best:
         captions_norm = vdir / "captions.norm.en.vtt"
         captions_norm.write_text(captions_best.read_text())
-    has_captions = captions_norm is not None
+    job["captions_best"] = captions_best
+    job["captions_norm"] = captions_norm
 
-    # 6) Extract audio.wav
-    audio_wav = vdir / "audio.wav"
-    run(f'ffmpeg -y -i "{audio_src}" -ac 1 -ar 16000 -vn -acodec pcm_s16le "{audio_wav}"')
+def _hash_source(job: dict) -> str:
+    with TRACE.stage(job["video_id"], "hash_source", job["audio_src"].stat().st_size):
+        return sha256_of(job["audio_src"])
 
-    # 7) Hashes (build once, omit optional fields when absent)
-    hashes = {
-        "audio_wav_sha256": sha256_of(audio_wav),
-        "content_sha": None,
-    }
-    hashes["content_sha"] = hashes["audio_wav_sha256"]
-    if has_captions:
-        hashes["captions_norm_vtt_sha256"] = sha256_of(captions_norm)
+def source_sha256(job: dict) -> str:
+    """Source media hash, waiting for the background hash started on a cache miss."""
+    if "source_sha256" not in job:
+        job["source_sha256"] = job.pop("source_sha256_future").result()
+    return job["source_sha256"]
+
+def restore_cached_audio(job: dict) -> bool:
+    """
+    Look up the derived audio in the artifact cache. The key is cheap to compute (video id +
+    source size + transcode settings); only a candidate hit hashes the source, to confirm it
+    against the source_sha256 stored with the entry. On a hit the file and its recorded hash
+    are restored into the job. On a miss the source is hashed in the background, overlapping
+    the transcode, and picked up by hash_artifacts.
+    """
+    # the command actually run: single-pass only emits raw PCM for wav (flac/opus use ffmpeg_cmd)
+    settings = ffmpeg_pcm_cmd("-") if SINGLE_PASS and AUDIO_CODEC == "wav" else ffmpeg_cmd("-", "-")
+    identity = f"{job['video_id']}:{job['audio_src'].stat().st_size}"
+    job["audio_cache_key"] = key = cache.cache_key("audio", identity, cmd=settings, codec=AUDIO_CODEC)
+    candidate = cache.get_json(f"{key}.meta")
+    if not candidate or "source_sha256" not in candidate:
+        job["source_sha256_future"] = _hash_pool.submit(_hash_source, job)
+        return False
+    job["source_sha256"] = _hash_source(job)
+    if job["source_sha256"] != candidate["source_sha256"]:
+        return False
+    meta = cache.get_file(key, job["audio_path"])
+    if meta is None:
+        return False
+    job.update(meta)
+    job["audio_cached"] = True
+    return True
+
+def write_probe(job: dict):
+    """ffprobe.json, built from the yt-dlp info dict when it describes the media, else ffprobe."""
+    job["ffprobe_path"] = path = job["vdir"] / "ffprobe.json"
+    probe = probe_from_info(job.get("info"))
+    if probe is not None:
+        path.write_text(json.dumps(probe, indent=2))
+        return
+    with TRACE.stage(job["video_id"], "ffprobe"), path.open("w") as out:
+        subprocess.check_call(ffprobe_cmd(job["audio_src"]), stdout=out)
+
+def transcode(job: dict):
+    """Stage 2: ffprobe, caption normalization and derived audio extraction."""
+    vdir, video_id = job["vdir"], job["video_id"]
+    write_probe(job)
+
+    normalize_captions(job)
+
+    job["audio_path"] = vdir / AUDIO_NAME
+    if not restore_cached_audio(job):
+        job["audio_path"].unlink(missing_ok=True)  # may be hard-linked into the cache
+        with TRACE.stage(video_id, "ffmpeg", job["audio_src"].stat().st_size):
+            _sh(ffmpeg_cmd(job["audio_src"], job["audio_path"]))
 
-    # 8) Provenance
+def transcode_single_pass(job: dict):
+    """
+    Stage 2 (+ audio hash) in one pass, for SINGLE_PASS_TRANSCODE=true.
+    ffmpeg decodes the source once and writes to a pipe; each chunk feeds the SHA-256
+    digest, the local audio file and, with STREAM_AUDIO_UPLOAD=true, a multipart S3 upload.
+    - flac/opus: the encoded stream is written as-is, so the digest is the file hash. ffmpeg
+      cannot seek back on a pipe, so FLAC's STREAMINFO keeps total samples and MD5 unset;
+      decoders (ffmpeg, whisper) still read it, but the file carries no duration/MD5 header
+    - wav: ffmpeg emits raw PCM and the WAV header is patched in at the end (local seek +
+      deferred S3 part 1), so the digest covers the samples (hashes.json: audio_pcm_sha256)
+    """
+    vdir, video_id = job["vdir"], job["video_id"]
+    write_probe(job)
+
+    normalize_captions(job)
+
+    job["audio_path"] = audio_path = vdir / AUDIO_NAME
+    if restore_cached_audio(job):
+        return
+    audio_path.unlink(missing_ok=True)  # may be hard-linked into the cache
+
+    key = s3_key(video_id, f"derived/{AUDIO_NAME}")
+    stream = None
+    if STREAM_AUDIO_UPLOAD and not s3_exists(key):
+        stream = MultipartStream(s3_client(), S3_BUCKET, key, AUDIO["content_type"])
+
+    pcm = AUDIO_CODEC == "wav"
+    h, n = hashlib.sha256(), 0
+    cmd = ffmpeg_pcm_cmd(job["audio_src"]) if pcm else ffmpeg_cmd(job["audio_src"], "pipe:1")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        with audio_path.open("wb") as out:
+            if pcm:
+                placeholder = wav_header(0)
+                out.write(placeholder)
+                if stream:
+                    stream.write(placeholder)
+            for chunk in iter(lambda: proc.stdout.read(1 << 20), b""):
+                h.update(chunk)
+                out.write(chunk)
+                if stream:
+                    stream.write(chunk)
+                n += len(chunk)
+            if proc.wait():
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+            header = b""
+            if pcm:
+                header = wav_header(n)
+                out.seek(0)
+                out.write(header)
+        if stream:
+            stream.finish(head=header)
+    except BaseException:
+        proc.kill()
+        if stream:
+            stream.abort()
+        raise
+
+    # ffmpeg + hash + write (+ stream upload) overlap, so they are one stage here
+    TRACE.record(video_id, "ffmpeg_single_pass", time.perf_counter() - t0, job["audio_src"].stat().st_size)
+    job["audio_pcm_sha256" if pcm else AUDIO_HASH_FIELD] = h.hexdigest()
+    job["audio_streamed"] = stream is not None
+
+def hash_artifacts(job: dict):
+    """Stage 3: hashes (build once, omit optional fields when absent)."""
+    if "audio_pcm_sha256" in job or AUDIO_HASH_FIELD in job:
+        nbytes = 0  # audio hash already known (single-pass or cache hit)
+    else:
+        nbytes = job["audio_path"].stat().st_size
+    if job["captions_norm"]:
+        nbytes += job["captions_norm"].stat().st_size
+    with TRACE.stage(job["video_id"], "hash", nbytes):
+        _hash_artifacts(job)
+
+def _hash_artifacts(job: dict):
+    if "audio_pcm_sha256" in job:
+        # single-pass mode already hashed the samples on the way through
+        hashes = {"audio_pcm_sha256": job["audio_pcm_sha256"], "content_sha": job["audio_pcm_sha256"]}
+    else:
+        hashes = {
+            AUDIO_HASH_FIELD: job.get(AUDIO_HASH_FIELD) or sha256_of(job["audio_path"]),
+            "content_sha": None,
+        }
+        hashes["content_sha"] = hashes[AUDIO_HASH_FIELD]
+    hashes["audio_codec"] = AUDIO_CODEC
+    hashes["source_sha256"] = source_sha256(job)
+    if not job.get("audio_cached"):
+        audio_field = "audio_pcm_sha256" if "audio_pcm_sha256" in hashes else AUDIO_HASH_FIELD
+        cache.put_file(job["audio_cache_key"], job["audio_path"],
+                       meta={audio_field: hashes[audio_field], "source_sha256": hashes["source_sha256"]})
+    if job["captions_norm"]:
+        hashes["captions_norm_vtt_sha256"] = sha256_of(job["captions_norm"])
+    job["hashes"] = hashes
+
+def publish(job: dict):
+    """Stage 4: provenance, S3 uploads, DDB item and local cleanup."""
+    video_id, vdir, url, meta = job["video_id"], job["vdir"], job["url"], job["meta"]
+    info_json, ffprobe_path, audio_path = job["info_json"], job["ffprobe_path"], job["audio_path"]
+    captions_best, captions_norm, hashes = job["captions_best"], job["captions_norm"], job["hashes"]
+    has_captions = captions_norm is not None
+
+    # Provenance
     prov = {
         "video_id": video_id,
         "url": url,
@@ -193,23 +478,40 @@ def ingest_one(video_id: str, title: str):
         "pipeline": "audio-first"
     }
 
-    # 9) Upload to S3
-    upload_file(info_json,    s3_key(video_id, "raw/metadata.json"),  "application/json") if info_json.exists() else None
-    upload_file(ffprobe_path, s3_key(video_id, "raw/ffprobe.json"),   "application/json")
+    # Upload to S3: artifacts concurrently, then hashes.json once they are all in place.
+    # Hashed artifacts are re-uploaded only when the published hashes.json disagrees.
+    remote = remote_hashes(video_id)
+    audio_changed = remote.get("content_sha") != hashes["content_sha"]
+    captions_changed = remote.get("captions_norm_vtt_sha256") != hashes.get("captions_norm_vtt_sha256")
+    uploads = [(ffprobe_path, s3_key(video_id, "raw/ffprobe.json"), "application/json")]
+    if info_json.exists():
+        uploads.append((info_json, s3_key(video_id, "raw/metadata.json"), "application/json"))
     if captions_best:
-        upload_file(captions_best, s3_key(video_id, f"raw/{captions_best.name}"), "text/vtt")
-    upload_file(audio_wav,    s3_key(video_id, "derived/audio.wav"),  "audio/wav")
+        # the raw captions file name varies per video; trace it under one stage name
+        uploads.append((captions_best, s3_key(video_id, f"raw/{captions_best.name}"), "text/vtt", captions_changed,
+                        "captions_raw"))
+    if not job.get("audio_streamed"):
+        uploads.append((audio_path, s3_key(video_id, f"derived/{AUDIO_NAME}"), AUDIO["content_type"], audio_changed))
     if has_captions:
-        upload_file(captions_norm, s3_key(video_id, "derived/captions.norm.en.vtt"), "text/vtt")
+        uploads.append((captions_norm, s3_key(video_id, "derived/captions.norm.en.vtt"), "text/vtt", captions_changed))
+    upload_all(uploads)
 
     (vdir / "hashes.json").write_text(json.dumps(hashes, indent=2))
     (vdir / "provenance.json").write_text(json.dumps(prov, indent=2))
-    upload_file(vdir / "hashes.json",     s3_key(video_id, "hashes.json"),         "application/json")
-    upload_file(vdir / "provenance.json", s3_key(video_id, "raw/provenance.json"), "application/json")
-
-    # 10) Build DDB item (no None values)
+    bookkeeping = [
+        (vdir / "hashes.json",     s3_key(video_id, "hashes.json"),         "application/json", remote != hashes),
+        (vdir / "provenance.json", s3_key(video_id, "raw/provenance.json"), "application/json"),
+    ]
+    upload_all(bookkeeping)
+    # everything above is now in S3, so the work-dir budget may evict the local copies
+    published = [(path, key) for path, key, *_ in uploads + bookkeeping]
+    if job.get("audio_streamed"):
+        published.append((audio_path, s3_key(video_id, f"derived/{AUDIO_NAME}")))
+    record_uploaded(vdir, published)
+
+    # Build DDB item (no None values)
     assets = {
-        "audio_wav":     f"s3://{S3_BUCKET}/{s3_key(video_id, 'derived/audio.wav')}",
+        f"audio_{AUDIO_CODEC}": f"s3://{S3_BUCKET}/{s3_key(video_id, f'derived/{AUDIO_NAME}')}",
         "metadata_json": f"s3://{S3_BUCKET}/{s3_key(video_id, 'raw/metadata.json')}" if info_json.exists() else None,
         "ffprobe_json":  f"s3://{S3_BUCKET}/{s3_key(video_id, 'raw/ffprobe.json')}",
     }
@@ -221,7 +523,7 @@ def ingest_one(video_id: str, title: str):
     item = {
         "videoid": f"video#{video_id}",
         "version": "meta#v0",
-        "title": title,
+        "title": job["title"],
         "url": url,
         "ingested_at": prov["downloaded_at"],
         "processing_version": PROCESSING_VERSION,
@@ -239,40 +541,233 @@ def ingest_one(video_id: str, title: str):
     if dur is not None:
         item["dur_sec"] = int(dur)
 
-    ddb.put_item(Item=item)
+    # only buffered here; the writer traces each batch it sends ("ddb_batch_write")
+    ddb_writer().put(item, on_written=job.get("on_written"), on_failed=job.get("on_failed"))
 
-    # 11) Cleanup local progressive file if desired
-    if not KEEP_SOURCE and audio_src.exists() and audio_src.name != "audio.wav":
+    # Cleanup local progressive file if desired
+    audio_src = job["audio_src"]
+    if not KEEP_SOURCE and audio_src.exists() and audio_src.name != AUDIO_NAME:
         audio_src.unlink()
 
+def ingest_one(video_id: str, title: str, on_written=None, on_failed=None):
+    job = new_job(video_id, title, on_written, on_failed)
+
+    # 1) MEDIA via Android (no cookies), captions from the same extraction or web+cookies (best-effort)
+    job["info"] = download_audio_any(job["url"], job["vdir"])
+    if not locate_media(job):
+        return
+
+    # 2) ffprobe + captions + derived audio
+    if SINGLE_PASS:
+        transcode_single_pass(job)
+    else:
+        transcode(job)
+
+    # 3) Hashes
+    hash_artifacts(job)
+
+    # 4) Upload to S3 + DDB
+    publish(job)
+
+def ingest_locked(video_id: str, title: str, ledger: Ledger, max_attempts: int) -> str:
+    """
+    Run ingest_one while holding the work/<video_id> lock and record the outcome in the ledger.
+    Returns "ok", "failed" (will be retried), "dead" (out of attempts),
+    or "locked" if another worker/process already owns the video.
+    """
+    with dir_lock(WORK / video_id, blocking=False) as acquired:
+        if not acquired:
+            return "locked"
+        ledger.mark_running(video_id)
+        try:
+            # done is recorded when the batched DDB write lands, so a crash before the
+            # flush leaves the video "running" and it is picked up again next run;
+            # a batch that fails later counts as a failed attempt for every video in it
+            ingest_one(video_id, title, on_written=lambda: ledger.mark_done(video_id),
+                       on_failed=lambda e: ledger.mark_failed(video_id, repr(e), max_attempts))
+        except Exception as e:
+            print(f"[{video_id}] failed: {e!r}", file=sys.stderr)
+            return ledger.mark_failed(video_id, repr(e), max_attempts)
+        return "ok"
+
+def ingest_pool(rows, workers: int, ledger: Ledger, max_attempts: int):
+    """
+    Ingest manifest rows across a bounded thread pool.
+    Threads are enough here: each video spends its time in yt-dlp/ffmpeg subprocesses
+    and S3/DDB network calls, so one video's downloads overlap with another's transcode.
+    """
+    results = {"ok": [], "locked": [], "failed": [], "dead": []}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(ingest_locked, row["video_id"], row.get("title", ""), ledger, max_attempts): row
+            for row in rows
+        }
+        for fut in as_completed(futures):
+            row = futures[fut]
+            status = fut.result()
+            results[status].append(row)
+            print(f"[{row['video_id']}] {status}")
+    return results
+
+def flushed_rounds(run_round, ledger: Ledger):
+    """
+    Wrap run_round so every round ends with the DDB writer flushed. A video counts as "ok" when
+    its pipeline finished, but its item may sit in a batch that fails later (on_failed marks it
+    in the ledger): after the flush, such rows move to "failed"/"dead" so the retry queue and
+    the summary see them.
+    """
+    def run(queue):
+        results = run_round(queue)
+        ddb_writer().flush()
+        ok, results["ok"] = results["ok"], []
+        for row in ok:
+            rec = ledger.get(row["video_id"])
+            status = rec["status"] if rec and rec["status"] in (FAILED, DEAD) else "ok"
+            if status != "ok":
+                print(f"[{row['video_id']}] {status}: DDB write failed ({rec['last_error']})", file=sys.stderr)
+            results[status].append(row)
+        return results
+    return run
+
+def ingest_batch(rows, run_round):
+    """
+    Retry queue: failed videos are re-run in later rounds (with _backoff between rounds)
+    until they succeed or land on the dead-letter list, so one pass finishes the batch.
+    `run_round(rows)` ingests one round and returns results keyed by status.
+    """
+    totals = {"ok": [], "locked": [], "dead": []}
+    queue, rnd = list(rows), 0
+    while queue:
+        if rnd:
+            print(f"\nRetry round {rnd}: {len(queue)} videos")
+            _backoff(rnd)
+        results = run_round(queue)
+        for k in totals:
+            totals[k].extend(results[k])
+        queue, rnd = results["failed"], rnd + 1
+    return totals
+
+def print_summary(results, ledger: Ledger, skipped: int):
+    print(f"\nIngest summary: {len(results['ok'])} ok, {len(results['dead'])} dead-lettered, "
+          f"{len(results['locked'])} skipped (locked), {skipped} skipped (already done/dead in ledger)")
+    for rec in ledger.dead_letters():
+        print(f"  DEAD {rec['video_id']} after {rec['attempts']} attempts: {rec['last_error']}")
+
+def duration_of(row: dict) -> int | None:
+    """duration_sec from the manifest (filled in by discover), None for older manifests."""
+    value = row.get("duration_sec")
+    return int(float(value)) if value not in (None, "") else None
+
+def usable(row: dict) -> bool:
+    # live streams and premieres report a zero duration; unknown durations are still tried
+    dur = duration_of(row)
+    return dur is None or dur > 0
+
+def longest_first(rows):
+    """Longest videos first so the slowest jobs start early and don't straggle at the end."""
+    return sorted(rows, key=lambda row: -(duration_of(row) or 0))
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """'i/N' -> (i, N), 0 <= i < N."""
+    try:
+        i, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {spec!r}")
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {n}), got {i}")
+    return i, n
+
+def shard_of(video_id: str, n: int) -> int:
+    # stable across runs, hosts and processes (unlike hash()), and independent of manifest order
+    return int.from_bytes(hashlib.sha1(video_id.encode()).digest()[:8], "big") % n
+
+def shard_ledger_path(i: int, n: int) -> pathlib.Path:
+    return WORK / f"ingest_ledger.shard-{i}-of-{n}.sqlite"
+
 def main():
     parser = argparse.ArgumentParser(prog='ingest')
     parser.add_argument('-s', '--start', help='Row to start ingestion process from', type=int)
+    parser.add_argument('-w', '--workers', help='Number of videos to ingest concurrently', type=int, default=1)
+    parser.add_argument('--max-attempts', help='Attempts per video before it is dead-lettered', type=int, default=3)
+    parser.add_argument('--requeue-dead', help='Give dead-lettered videos a fresh set of attempts', action='store_true')
+    parser.add_argument('--staged', help='Use the asyncio staged pipeline (download/transcode/hash/upload)', action='store_true')
+    parser.add_argument('--download-workers', help='Concurrent downloads in --staged mode', type=int, default=4)
+    parser.add_argument('--transcode-workers', help='Concurrent ffmpeg transcodes in --staged mode', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--hash-workers', help='Concurrent hashing jobs in --staged mode', type=int, default=2)
+    parser.add_argument('--upload-workers', help='Concurrent S3/DDB publishes in --staged mode', type=int, default=4)
+    parser.add_argument('--queue-size', help='Max videos buffered between stages in --staged mode', type=int, default=8)
+    parser.add_argument('--report', help='Print per-stage timings from the trace file and exit', action='store_true')
+    parser.add_argument('--shard', help='Ingest only videos whose id hashes to shard i of N (e.g. 0/4)', type=parse_shard)
+    parser.add_argument('--work-budget-gb', help='Evict uploaded artifacts (LRU) to keep work/ under this size', type=float,
+                        default=float(os.environ["WORK_BUDGET_GB"]) if os.environ.get("WORK_BUDGET_GB") else None)
+    parser.add_argument('--merge-ledgers', help='Merge per-shard ledgers into the main ledger and exit', nargs='+', type=pathlib.Path, metavar='LEDGER')
     args = parser.parse_args()
+    if AUDIO is None:
+        parser.error(f"AUDIO_CODEC must be one of {sorted(AUDIO_CODECS)}, got {AUDIO_CODEC!r}")
+    WORK.mkdir(exist_ok=True, parents=True)
+
+    if args.merge_ledgers:
+        ledger = Ledger(LEDGER_PATH)
+        for path in args.merge_ledgers:
+            print(f"Merged {ledger.merge(path)} videos from {path}")
+        print_summary({"ok": [], "locked": [], "dead": []}, ledger, skipped=0)
+        ledger.close()
+        return
 
-    if not MANIFEST_PATH.exists():
+    if args.report:
+        if not TRACE_PATH.exists():
+            print(f"No trace at {TRACE_PATH}", file=sys.stderr)
+            sys.exit(1)
+        print(report(TRACE_PATH))
+        return
+
+    if not MANIFEST_PATH or not MANIFEST_PATH.exists():
         print(MANIFEST_PATH)
         print("manifest.csv not found", file=sys.stderr)
         sys.exit(1)
     
-    start_row = 0
+    with MANIFEST_PATH.open() as f:
+        rows = list(csv.DictReader(f))
+
     if args.start:
-        with open(MANIFEST_PATH, 'r', newline='') as file:
-            reader = csv.reader(file)
-            row_count = sum(1 for row in reader)
-        if args.start > row_count:
+        if args.start > len(rows):
             print("Start row can not be greater than manifest.csv length")
             sys.exit(1)
-        start_row = args.start
-    
-    
-    with MANIFEST_PATH.open() as f:
-        reader = csv.DictReader(f)
-        for _ in range(start_row):
-            next(reader, None)
-
-        for row in reader:
-            ingest_one(row["video_id"], row.get("title",""))
+        rows = rows[args.start:]
+
+    ledger_path = LEDGER_PATH
+    if args.shard:
+        i, n = args.shard
+        rows = [row for row in rows if shard_of(row["video_id"], n) == i]
+        ledger_path = shard_ledger_path(i, n)
+        print(f"Shard {i}/{n}: {len(rows)} videos, ledger {ledger_path}")
+
+    ledger = Ledger(ledger_path)
+    if args.requeue_dead:
+        print(f"Requeued {ledger.requeue_dead()} dead-lettered videos")
+
+    unusable = [row for row in rows if not usable(row)]
+    if unusable:
+        print(f"Skipping {len(unusable)} unusable videos (live/upcoming)")
+    pending = longest_first(row for row in rows if usable(row) and not ledger.is_settled(row["video_id"]))
+    if args.staged:
+        from video_pipeline.pipelines.ingest_async import StageLimits, run_staged
+        limits = StageLimits(args.download_workers, args.transcode_workers,
+                             args.hash_workers, args.upload_workers, args.queue_size)
+        run_round = lambda queue: asyncio.run(run_staged(queue, limits, ledger, args.max_attempts))
+    else:
+        run_round = partial(ingest_pool, workers=args.workers, ledger=ledger, max_attempts=args.max_attempts)
+    with ExitStack() as stack:
+        stack.enter_context(ddb_writer())
+        if args.work_budget_gb:
+            stack.enter_context(WorkDirBudget(WORK, int(args.work_budget_gb * 1e9)).watching())
+        results = ingest_batch(pending, flushed_rounds(run_round, ledger))
+    print_summary(results, ledger, skipped=len(rows) - len(unusable) - len(pending))
+    ledger.close()
 
 if __name__ == "__main__":
-    main()
+    # `python -m` runs this file as __main__, a second copy of the module; ingest_async
+    # imports video_pipeline.pipelines.ingest, so run main() from that copy to keep a single
+    # ddb_writer() and TRACE per run (the one main flushes is the one publish buffers into)
+    from video_pipeline.pipelines import ingest
+    ingest.main()
@@ -0,0 +1,139 @@
+"""
+Staged asyncio ingest:
+
+download -> transcode -> hash -> publish, connected by bounded queues.
+- Each stage runs its own number of workers, so network-bound stages (yt-dlp, S3/DDB)
+  overlap with CPU-bound ones (ffmpeg, sha256) across different videos
+- Bounded queues give backpressure: downloads pause once transcoding falls behind,
+  so we never buffer more than `queue_size` downloaded videos per stage on disk
+- ffmpeg runs via asyncio subprocesses; in-process yt-dlp, hashing and boto3 calls run in
+  threads (one reusable YoutubeDL per thread)
+
+pipenv run python -m video_pipeline.pipelines.ingest --staged --download-workers 4 --transcode-workers 2
+"""
+
+import asyncio
+import subprocess
+import sys
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import partial
+
+from video_pipeline.pipelines.ingest import (
+    AUDIO_NAME, SINGLE_PASS, TRACE, ffmpeg_cmd, download_audio_any,
+    new_job, locate_media, write_probe, normalize_captions, restore_cached_audio, transcode_single_pass,
+    hash_artifacts, publish,
+)
+from video_pipeline.services.ledger import Ledger
+from video_pipeline.utils.file_utils import dir_lock
+
+
+@dataclass
+class StageLimits:
+    download: int = 4
+    transcode: int = 2
+    hash: int = 2
+    upload: int = 4
+    queue_size: int = 8
+
+
+async def _exec(cmd: list[str], stdout=None):
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=stdout)
+    rc = await proc.wait()
+    if rc:
+        raise subprocess.CalledProcessError(rc, cmd)
+
+
+async def download(job: dict):
+    # ingest.download_audio_any blocks on the token bucket and the YoutubeDL download
+    job["info"] = await asyncio.to_thread(download_audio_any, job["url"], job["vdir"])
+
+
+async def transcode(job: dict):
+    if SINGLE_PASS:
+        # the pipe tee (hash + file + optional S3 stream) is blocking I/O: keep it off the loop
+        return await asyncio.to_thread(transcode_single_pass, job)
+
+    vdir, video_id = job["vdir"], job["video_id"]
+    await asyncio.to_thread(write_probe, job)
+
+    normalize_captions(job)
+
+    job["audio_path"] = vdir / AUDIO_NAME
+    if not await asyncio.to_thread(restore_cached_audio, job):
+        job["audio_path"].unlink(missing_ok=True)  # may be hard-linked into the cache
+        with TRACE.stage(video_id, "ffmpeg", job["audio_src"].stat().st_size):
+            await _exec(ffmpeg_cmd(job["audio_src"], job["audio_path"]))
+
+
+async def run_staged(rows, limits: StageLimits, ledger: Ledger, max_attempts: int):
+    """
+    Ingest one round of manifest rows through the staged pipeline.
+    Returns results keyed by status ("ok", "locked", "failed", "dead"), like ingest.ingest_pool.
+    """
+    results = {"ok": [], "locked": [], "failed": [], "dead": []}
+
+    def finish(job: dict, status: str):
+        job["lock"].close()
+        results[status].append(job["row"])
+        print(f"[{job['video_id']}] {status}")
+
+    async def fetch(job: dict):
+        job["lock"] = ExitStack()
+        if not job["lock"].enter_context(dir_lock(job["vdir"], blocking=False)):
+            return "locked"
+        ledger.mark_running(job["video_id"])
+        await download(job)
+        if not await asyncio.to_thread(locate_media, job):
+            return "ok"
+
+    async def hash_(job: dict):
+        await asyncio.to_thread(hash_artifacts, job)
+
+    async def publish_(job: dict):
+        await asyncio.to_thread(publish, job)
+        return "ok"
+
+    # (stage fn, worker count); each fn returns None to pass the job on, or a final status
+    stages = [
+        (fetch, limits.download),
+        (transcode, limits.transcode),
+        (hash_, limits.hash),
+        (publish_, limits.upload),
+    ]
+    queues = [asyncio.Queue()] + [asyncio.Queue(maxsize=limits.queue_size) for _ in stages[1:]]
+
+    async def worker(fn, inbox: asyncio.Queue, outbox: asyncio.Queue | None):
+        while (job := await inbox.get()) is not None:
+            try:
+                status = await fn(job)
+            except Exception as e:
+                print(f"[{job['video_id']}] failed: {e!r}", file=sys.stderr)
+                finish(job, ledger.mark_failed(job["video_id"], repr(e), max_attempts))
+                continue
+            if status is not None:
+                finish(job, status)
+            else:
+                await outbox.put(job)
+
+    async def run_stage(i: int):
+        fn, n = stages[i]
+        outbox = queues[i + 1] if i + 1 < len(stages) else None
+        await asyncio.gather(*(worker(fn, queues[i], outbox) for _ in range(n)))
+        if outbox is not None:
+            # all workers drained: tell every worker of the next stage to stop
+            for _ in range(stages[i + 1][1]):
+                await outbox.put(None)
+
+    for row in rows:
+        # done is recorded when the batched DDB write for the video lands, failed if it does not
+        vid = row["video_id"]
+        job = new_job(vid, row.get("title", ""), partial(ledger.mark_done, vid),
+                      lambda e, vid=vid: ledger.mark_failed(vid, repr(e), max_attempts))
+        job["row"] = row
+        queues[0].put_nowait(job)
+    for _ in range(limits.download):
+        queues[0].put_nowait(None)
+
+    await asyncio.gather(*(run_stage(i) for i in range(len(stages))))
+    return results
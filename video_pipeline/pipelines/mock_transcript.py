@@ -1,10 +1,12 @@
 
 import argparse
-import subprocess
 import re
 from pathlib import Path
 import sys
 
+from video_pipeline.services.captions import cues_to_transcript, iter_cues
+from video_pipeline.services.ytdlp import Downloader, DownloadError
+
 def get_video_id(url_or_id):
     """
     Extracts video ID from a YouTube URL or returns the ID if it looks like one.
@@ -22,34 +24,10 @@ def get_video_id(url_or_id):
 def clean_vtt(vtt_content):
     """
     Simple VTT cleaner to get plain text.
-    Removes timestamps, header, and duplicate lines.
+    Same cue parser as the pipeline (services.captions): timestamps, header and tags
+    removed, consecutive duplicate lines dropped.
     """
-    lines = vtt_content.splitlines()
-    text_lines = []
-    seen = set()
-    
-    for line in lines:
-        line = line.strip()
-        # skip header, timestamps, empty lines
-        if not line: continue
-        if line.startswith("WEBVTT"): continue
-        if "-->" in line: continue
-        if line.startswith("NOTE"): continue
-        
-        # remove unwanted tags 
-        line = re.sub(r'<[^>]+>', '', line)
-        
-        # avoid immediate duplicates (common in auto-captions)
-        if line in seen:
-            continue
-        
-        # avoid repeats
-        if text_lines and text_lines[-1] == line:
-            continue
-            
-        text_lines.append(line)
-        
-    return " ".join(text_lines)
+    return cues_to_transcript(iter_cues(vtt_content.splitlines()))
 
 def download_transcript(url, output_dir):
     """
@@ -60,28 +38,24 @@ def download_transcript(url, output_dir):
     
     print(f"Fetching info for: {url}")
     
-    # 1. download subs
-    # --skip-download: don't download video
-    # --write-subs: write subtitle file
-    # --write-auto-subs: write auto-generated subs if no manual ones
-    # --sub-lang en.*: prefer English
-    cmd = [
+    # 1. download subs (in-process yt-dlp, paced by the shared token bucket)
+    # skip_download: don't download video
+    # writesubtitles: write subtitle file
+    # writeautomaticsub: write auto-generated subs if no manual ones
+    # subtitleslangs en.*: prefer English
+    downloader = Downloader(
+        skip_download=True,
+        writesubtitles=True,
+        writeautomaticsub=True,
+        subtitleslangs=["en.*"],
+        outtmpl=str(output_dir / "%(title)s [%(id)s].%(ext)s"),
+        retries=10,
+        extractor_args={"youtube": {"player_client": ["web_creator", "android"]}},
+    )
 
-        "yt-dlp",
-        "--skip-download",
-        "--write-subs",
-        "--write-auto-subs",
-        "--sub-lang", "en.*",
-        "--output", str(output_dir / "%(title)s [%(id)s].%(ext)s"),
-        "--retries", "10",
-        "--sleep-requests", "2",
-        "--extractor-args", "youtube:player_client=web_creator,android", 
-        url
-    ]
-    
     try:
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as e:
+        downloader.fetch(url)
+    except DownloadError as e:
         print(f"Error running yt-dlp: {e}")
         print("Moving on to check if any transcript was downloaded...")
 
@@ -2,70 +2,236 @@
 Plan Segments Functionality: 
 - Load transcript (VTT) if present; otherwise fall back to a coarse ASR later (for now, mark needs_alignment).
 - Convert captions → utterances: {utterance_id, text, start, end}.
-- Score each utterance for “code-talk”.
+- Score each utterance for “code-talk” (cached per captions file and scorer version).
 - Smooth + merge contiguous hits into segments.Pad segment boundaries and clamp to duration.
 - Write a single DDB item SK="segments#v0" and (optionally) derived/segments.json in S3.
 
 pipenv run python -m video_pipeline.pipelines.plan_segments --video-id <ID>
-pipenv run python -m video_pipeline.pipelines.plan_segments --parse_all
+pipenv run python -m video_pipeline.pipelines.plan_segments --parse_all [--workers N] [--force]
+  (process pool over work/, batched DDB reads and writes; videos whose segments#v0 item has
+   the same captions hash, scorer and params are skipped)
+pipenv run python -m video_pipeline.pipelines.plan_segments --sweep --thresh 0.45 0.55 0.65 --merge-gap-sec 3 6 [--fps 0.5] [--sweep-out sweep.csv]
+  (scores the corpus once, evaluates every combination of the given values in memory and
+   reports segments / covered seconds / frames at --fps per combination; no DDB writes;
+   --video-id limits it to one video)
 
 """
 
-import argparse, os
+import argparse, csv, itertools, os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from video_pipeline.services.captions import load_transcript, parse_vtt
-from video_pipeline.services.ddb import write_segments_item, read_meta
-from video_pipeline.domain.segments import plan_segments
+import numpy as np
+
+from video_pipeline.services import cache
+from video_pipeline.services.captions import PARSER_VERSION, UtteranceCorpus, load_transcript, open_corpus, parse_vtt
+from video_pipeline.services.ddb import BatchWriter, table, to_item, write_segments_item, read_items, read_meta
+from video_pipeline.domain.segments import DEFAULT_SCORER, SCORERS, merge_intervals, merge_segments, score_utterances
 
 BASE = Path('work')
+START_OFFSET_SEC = 300.0  # skip first 5 minutes
+DEFAULT_PARAMS = dict(thresh=0.55, min_len_sec=3.0, merge_gap_sec=3.0, pad_sec=4.0)
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", os.cpu_count() or 1))
+
+
+def captions_sha(vtt: Path) -> str:
+    sha_field = "captions_norm_vtt_sha256" if vtt.name == "captions.norm.en.vtt" else None
+    return cache.input_sha(vtt, sha_field)
 
 
-def process_video(vid: str):
+def load_scores(vtt: Path, scorer: str = DEFAULT_SCORER, sha: str | None = None) -> dict:
     """
-    Each element inserted into "segments" represents a time window in the YouTube video where the model or 
-    heuristic believes the code editor/problem-solving portion occurs, the part of the video that's worth analyzing further
+    Per-utterance scores of a captions file, {"start": [...], "end": [...], "score": [...]},
+    cached by (captions hash, parser version, scorer version): retuning the merge params
+    reruns neither the parse nor the scorer
     """
-    meta = read_meta(vid) or {}
-    dur = float(meta.get("dur_sec", 0.0))
+    key = cache.cache_key("scores", sha or captions_sha(vtt),
+                          start_offset_sec=START_OFFSET_SEC, parser=PARSER_VERSION, scorer=scorer)
+    scores = cache.get_json(key)
+    if scores is None:
+        utts = parse_vtt(vtt, start_offset_sec=START_OFFSET_SEC, as_arrays=True)
+        scores = {
+            "start": utts.start.tolist(),
+            "end": utts.end.tolist(),
+            "score": score_utterances(utts, scorer),
+        }
+        cache.put_json(key, scores)
+    return scores
+
 
+def plan_video(vid: str, dur: float, scorer: str, params: dict, existing: dict | None = None) -> dict | None:
+    """
+    Parses, scores and merges one video without touching DDB (runs in the --parse_all
+    process pool). Returns the write_segments_item kwargs, or None when `existing` (the
+    current segments#v0 item) was planned from the same captions hash, scorer version and
+    params, so there is nothing to rewrite.
+    """
     vtt = load_transcript(vid)  # Path or None
     print(f"[{vid}] VTT? {vtt}")
     if not vtt:
         # record empty segments with a flag; downstream can trigger whisperx backfill
-        write_segments_item(
-            vid, [], scorer_version="v1", pad_sec=4.0,
-            notes={"needs_alignment": True, "reason": "no_vtt_found"}
-        )
-        return
+        return dict(segments=[], notes={"needs_alignment": True, "reason": "no_vtt_found"})
+
+    sha = captions_sha(vtt)
+    plan_params = dict(params, parser=PARSER_VERSION, start_offset_sec=START_OFFSET_SEC, video_duration=dur)
+    if (existing and existing.get("captions_sha") == sha and existing.get("scorer_version") == scorer
+            and existing.get("plan_params") == to_item(plan_params)):
+        return None
+
+    scores = load_scores(vtt, scorer, sha)
+    segs = merge_segments(scores["start"], scores["end"], scores["score"], video_duration=dur,
+                          reason=scorer, **params)
+    return dict(segments=segs, captions_sha=sha, plan_params=plan_params)
 
-    utts = parse_vtt(vtt, start_offset_sec=300.0)  # skip first 5 minutes
-    segs = plan_segments(
-        utts, video_duration=dur,
-        thresh=0.55, min_len_sec=3.0, merge_gap_sec=3.0, pad_sec=4.0
-    )
 
-    write_segments_item(vid, segs, scorer_version="v1", pad_sec=4.0)
+def process_video(vid: str, writer: BatchWriter | None = None, scorer: str = DEFAULT_SCORER,
+                  params: dict | None = None):
+    """
+    Each element inserted into "segments" represents a time window in the YouTube video where the model or 
+    heuristic believes the code editor/problem-solving portion occurs, the part of the video that's worth analyzing further
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    meta = read_meta(vid) or {}
+    dur = float(meta.get("dur_sec", 0.0))
+    planned = plan_video(vid, dur, scorer, params)
+    write_segments_item(vid, scorer_version=scorer, pad_sec=params["pad_sec"], writer=writer, **planned)
     # print(f"[{vid}] wrote {len(segs)} segments")
 
 
+def parse_all(vids, scorer: str, params: dict, workers: int = PLAN_WORKERS, force: bool = False):
+    """
+    Plans every video in `vids`:
+    - meta#v0 and segments#v0 items are prefetched with BatchGetItem (100 keys per call)
+    - parsing/scoring/merging fans out over a process pool (plan_video)
+    - videos whose segments#v0 already matches captions hash, scorer and params are skipped
+      (unless `force`), the rest are written through one BatchWriter
+    """
+    vids = list(vids)
+    metas = read_items(vids, "meta#v0")
+    existing = {} if force else read_items(vids, "segments#v0")
+    durs = [float((metas.get(vid) or {}).get("dur_sec", 0.0)) for vid in vids]
+
+    written = skipped = 0
+    with BatchWriter(table()) as writer, ProcessPoolExecutor(max_workers=workers) as pool:
+        plans = pool.map(plan_video, vids, durs, itertools.repeat(scorer), itertools.repeat(params),
+                         [existing.get(vid) for vid in vids], chunksize=8)
+        for vid, planned in zip(vids, plans):
+            if planned is None:
+                skipped += 1
+                continue
+            write_segments_item(vid, scorer_version=scorer, pad_sec=params["pad_sec"], writer=writer, **planned)
+            written += 1
+    print(f"Planned {written} videos, skipped {skipped} unchanged")
+
+
+def video_ids():
+    """Videos under work/ with an English .vtt (the --parse_all / --sweep corpus)"""
+    for p in BASE.iterdir():
+        if not p.is_dir():
+            continue
+        has_any_vtt = any("en" in v.name.lower() and v.suffix == ".vtt" for v in p.glob("*.vtt"))
+        if has_any_vtt:
+            yield p.name
+
+
+def sweep(vids, grid: dict, fps: float, scorer: str = DEFAULT_SCORER, corpus: UtteranceCorpus | None = None) -> list[dict]:
+    """
+    Evaluates every combination of the merge params in `grid` ({param: [values]}) over the
+    corpus without writing anything: each video is parsed and scored once (load_scores),
+    or read from the memory-mapped utterance `corpus` when it holds the video, then every
+    combination is one merge_intervals call over the concatenated corpus.
+    Frames are ceil(segment length * fps) per segment, summed.
+    """
+    if corpus is not None and corpus.scorer != scorer:
+        raise ValueError(f"Utterance corpus was scored with {corpus.scorer}, not {scorer}")
+    vids = list(vids)
+    metas = read_items(vids, "meta#v0")
+    starts, ends, scores, video, durations = [], [], [], [], []
+    for vid in vids:
+        if corpus is not None and vid in corpus:
+            utts = corpus.video(vid)
+            start, end, score = (utts.column(c).to_numpy() for c in ("start", "end", "score"))
+            keep = end > START_OFFSET_SEC  # the window load_scores applies
+            start, end, score = start[keep], end[keep], score[keep]
+        else:
+            vtt = load_transcript(vid)
+            if not vtt:
+                continue
+            sc = load_scores(vtt, scorer)
+            start, end, score = np.array(sc["start"]), np.array(sc["end"]), np.array(sc["score"])
+        meta = metas.get(vid) or {}
+        video.append(np.full(len(start), len(durations), dtype=np.int64))
+        durations.append(float(meta.get("dur_sec", 0.0)))
+        starts.append(start)
+        ends.append(end)
+        scores.append(score)
+    starts, ends, scores, video = (np.concatenate(a) if a else np.zeros(0) for a in (starts, ends, scores, video))
+    durations = np.array(durations)
+    print(f"Sweeping {len(durations)} videos, {len(starts)} utterances")
+
+    names = list(DEFAULT_PARAMS)
+    rows = []
+    for combo in itertools.product(*(grid[k] for k in names)):
+        params = dict(zip(names, combo))
+        segs = merge_intervals(starts, ends, scores, durations, video=video, **params)
+        length = segs["t1"] - segs["t0"]
+        rows.append({
+            **params,
+            "segments": len(length),
+            "covered_sec": round(float(length.sum()), 3),
+            "frames": int(np.ceil(length * fps).sum()),
+        })
+    return rows
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--video-id", required=False)
     ap.add_argument('--parse_all', required=False, action="store_true")
+    ap.add_argument("--scorer", choices=sorted(SCORERS), default=DEFAULT_SCORER)
+    ap.add_argument("--workers", type=int, default=PLAN_WORKERS, help="--parse_all process pool size")
+    ap.add_argument("--force", action="store_true", help="--parse_all: replan videos whose segments are up to date")
+    # several values per merge param are only allowed with --sweep
+    ap.add_argument("--thresh", type=float, nargs="+", default=[DEFAULT_PARAMS["thresh"]])
+    ap.add_argument("--min-len-sec", type=float, nargs="+", default=[DEFAULT_PARAMS["min_len_sec"]])
+    ap.add_argument("--merge-gap-sec", type=float, nargs="+", default=[DEFAULT_PARAMS["merge_gap_sec"]])
+    ap.add_argument("--pad-sec", type=float, nargs="+", default=[DEFAULT_PARAMS["pad_sec"]])
+    ap.add_argument("--sweep", action="store_true",
+                    help="Report every combination of the merge params over the corpus; no DDB writes")
+    ap.add_argument("--fps", type=float, default=0.5, help="Frame rate for the sweep's frame counts")
+    ap.add_argument("--sweep-out", type=Path, help="Also write the sweep report to this CSV")
+    ap.add_argument("--from-corpus", action="store_true",
+                    help="--sweep: read utterances and scores from work/utterances.arrow (pipelines.utterance_corpus)")
     args = ap.parse_args()
+    grid = dict(thresh=args.thresh, min_len_sec=args.min_len_sec,
+                merge_gap_sec=args.merge_gap_sec, pad_sec=args.pad_sec)
+
+    if args.sweep:
+        corpus = open_corpus() if args.from_corpus else None
+        if args.from_corpus and corpus is None:
+            ap.error("no utterance corpus yet: run video_pipeline.pipelines.utterance_corpus")
+        vids = [args.video_id] if args.video_id else corpus.videos() if corpus else video_ids()
+        rows = sweep(vids, grid, fps=args.fps, scorer=args.scorer, corpus=corpus)
+        cols = list(rows[0])
+        print("  ".join(f"{c:>13}" for c in cols))
+        for row in rows:
+            print("  ".join(f"{row[c]:>13}" for c in cols))
+        if args.sweep_out:
+            with open(args.sweep_out, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=cols)
+                writer.writeheader()
+                writer.writerows(rows)
+        return
+
+    if any(len(values) > 1 for values in grid.values()):
+        ap.error("several values for a merge param need --sweep")
+    params = {k: values[0] for k, values in grid.items()}
 
     if args.parse_all:
-        for p in BASE.iterdir():
-            if not p.is_dir():
-                continue
-            has_any_vtt = any("en" in v.name.lower() and v.suffix == ".vtt" for v in p.glob("*.vtt"))
-            if not has_any_vtt:
-                continue
-            process_video(p.name)
+        parse_all(video_ids(), args.scorer, params, workers=args.workers, force=args.force)
     
     if args.video_id:
-        process_video(args.video_id)
+        process_video(args.video_id, scorer=args.scorer, params=params)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,6 +2,8 @@ import pandas as pd
 import re
 from pathlib import Path
 
+from video_pipeline.domain.dedupe import find_near_duplicates, find_re_explanations
+
 MANIFEST_PATH = Path("video_pipeline/manifests/manifest.csv")
 TRANSCRIPTS_DIR = Path("transcripts")
 OUTPUT_PATH = Path("transcripts/video_problem_transcripts.csv")
@@ -18,8 +20,20 @@ def load_transcript(video_id: str):
 
 def main():
     df = pd.read_csv(MANIFEST_PATH)
+    df = df.drop_duplicates(subset="video_id") # older manifests may repeat videos
     df["problem_id"] = df["title"].apply(extract_problem_id).astype("Int64") # int
     df["transcript"] = df["video_id"].apply(load_transcript) # transcript text
+
+    # near-duplicate transcripts (re-uploads, re-explanations): the first in manifest order
+    # stays canonical, the rest point at it so downstream scripts can skip them
+    docs = list(df.dropna(subset=["transcript"])[["video_id", "transcript"]].itertuples(index=False))
+    dupes = find_near_duplicates(docs)
+    df["duplicate_of"] = df["video_id"].map(dupes)
+    print(f"Flagged {len(dupes)} near-duplicate transcripts")
+    # looser signal (same problem explained in other words): flagged for review, not skipped
+    similar = {vid: canon for vid, canon in find_re_explanations(docs).items() if vid not in dupes}
+    df["similar_to"] = df["video_id"].map(similar)
+    print(f"Flagged {len(similar)} possible re-explanations for review (similar_to)")
     df.to_csv(OUTPUT_PATH, index=False)
     print(f"Saved final CSV to: {OUTPUT_PATH}")
 
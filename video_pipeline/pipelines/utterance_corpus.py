@@ -0,0 +1,107 @@
+"""
+Utterance Corpus:
+
+Builds work/utterances.arrow: the utterances of every video under work/ (video_id, start,
+end, text, score) in one memory-mappable Arrow IPC file, read through
+services.captions.open_corpus / UtteranceCorpus instead of re-parsing every VTT.
+- utterances are parse_vtt's (compacted, no start offset) with the chosen scorer's scores
+- incremental: a video is parsed again only when its captions hash changed; the rows of
+  unchanged videos are carried over from the previous file, videos no longer under work/
+  are dropped, and a new parser or scorer version rebuilds everything
+- new/changed videos are parsed and scored in a process pool
+- the file is written next to the old one and swapped in atomically
+
+pipenv run python -m video_pipeline.pipelines.utterance_corpus [--scorer heuristic_v1] [--full] [--workers N]
+"""
+
+import argparse, itertools, json, os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from video_pipeline.services.captions import CORPUS_PATH, PARSER_VERSION, corpus_schema, load_transcript, open_corpus, parse_vtt
+from video_pipeline.domain.segments import DEFAULT_SCORER, SCORERS, score_utterances
+from video_pipeline.pipelines.plan_segments import PLAN_WORKERS, captions_sha, video_ids
+
+
+def parse_and_score(vtt: Path, scorer: str) -> dict:
+    """Columns (start, end, text, score) of one captions file"""
+    utts = parse_vtt(vtt, as_arrays=True)
+    return {
+        "start": utts.start,
+        "end": utts.end,
+        "text": list(utts),
+        "score": score_utterances(utts, scorer),
+    }
+
+
+def build_corpus(vids, scorer: str = DEFAULT_SCORER, path: Path = CORPUS_PATH, full: bool = False,
+                 workers: int = PLAN_WORKERS):
+    """
+    (Re)writes the corpus at `path` for `vids`, reusing the previous file's rows where the
+    captions hash, parser version and scorer match. Returns (videos parsed, videos reused).
+    """
+    import pyarrow as pa
+
+    schema = corpus_schema()
+    old = None if full else open_corpus(path)
+    if old is not None and (old.parser_version != PARSER_VERSION or old.scorer != scorer):
+        print(f"Corpus built with parser {old.parser_version}, scorer {old.scorer}: rebuilding")
+        old.close()
+        old = None
+
+    parts, todo = {}, []
+    for vid in vids:
+        vtt = load_transcript(vid)
+        if not vtt:
+            continue
+        sha = captions_sha(vtt)
+        entry = old.index.get(vid) if old is not None else None
+        if entry and entry["captions_sha"] == sha:
+            parts[vid] = (sha, old.video(vid))
+        else:
+            todo.append((vid, vtt, sha))
+    reused = len(parts)
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            columns = pool.map(parse_and_score, [vtt for _, vtt, _ in todo], itertools.repeat(scorer), chunksize=8)
+            for (vid, _, sha), cols in zip(todo, columns):
+                parts[vid] = (sha, pa.table({"video_id": [vid] * len(cols["start"]), **cols}, schema=schema))
+
+    index, offset = {}, 0
+    for vid in sorted(parts):
+        n = parts[vid][1].num_rows
+        index[vid] = {"offset": offset, "length": n, "captions_sha": parts[vid][0]}
+        offset += n
+    tables = [parts[vid][1] for vid in sorted(parts)]
+    table = pa.concat_tables(tables).combine_chunks() if tables else schema.empty_table()
+    table = table.replace_schema_metadata({
+        "parser_version": PARSER_VERSION,
+        "scorer": scorer,
+        "index": json.dumps(index),
+    })
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".tmp-{path.name}")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    if old is not None:
+        old.close()
+    return len(todo), reused
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scorer", choices=sorted(SCORERS), default=DEFAULT_SCORER)
+    ap.add_argument("--full", action="store_true", help="Ignore the existing corpus and parse every video")
+    ap.add_argument("--workers", type=int, default=PLAN_WORKERS)
+    ap.add_argument("--out", type=Path, default=CORPUS_PATH)
+    args = ap.parse_args()
+
+    parsed, reused = build_corpus(video_ids(), args.scorer, path=args.out, full=args.full, workers=args.workers)
+    print(f"Wrote {args.out}: {parsed} videos parsed, {reused} reused")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Content-addressed artifact cache:
+
+Derived outputs (audio.wav, transcripts, segment plans) are stored under
+work/.cas/<key[:2]>/<key>, where key = sha256 of (stage, input hash, params, PROCESSING_VERSION).
+- Reruns with the same input and parameters restore the output instead of recomputing it
+- Changing a parameter or bumping PROCESSING_VERSION changes the key, so only that stage reruns
+- Input hashes come from work/<video_id>/hashes.json when ingest already recorded them
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from hashlib import sha256
+from pathlib import Path
+
+from video_pipeline.utils.file_utils import sha256_of
+
+CAS_ROOT = Path(os.environ.get("CAS_DIR", "work/.cas"))
+PROCESSING_VERSION = os.environ.get("PROCESSING_VERSION", "v0.1.0")
+
+
+def cache_key(stage: str, input_sha: str, **params) -> str:
+    payload = json.dumps(
+        {"stage": stage, "input": input_sha, "params": params, "processing_version": PROCESSING_VERSION},
+        sort_keys=True, default=str,
+    )
+    return sha256(payload.encode()).hexdigest()
+
+
+def input_sha(path: Path, field: str | None = None) -> str:
+    """
+    Hash of an input file, reusing the value ingest recorded in hashes.json (same directory)
+    under `field` when present, so large inputs are not re-read.
+    """
+    hashes_path = path.parent / "hashes.json"
+    if field and hashes_path.exists():
+        try:
+            recorded = json.loads(hashes_path.read_text()).get(field)
+        except ValueError:
+            recorded = None
+        if recorded:
+            return recorded
+    return sha256_of(path)
+
+
+def _entry(key: str) -> Path:
+    return CAS_ROOT / key[:2] / key
+
+
+def _atomic_write(dest: Path, write):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _link_or_copy(src: Path, dest: Path):
+    # hard links keep the cache free on the same filesystem; callers must unlink (not
+    # truncate) a restored file before rewriting it
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".tmp-{dest.name}")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+def put_file(key: str, src: Path, meta: dict | None = None):
+    """Store a file output (plus optional JSON metadata, e.g. its hash) under `key`."""
+    _link_or_copy(src, _entry(key))
+    if meta is not None:
+        put_json(f"{key}.meta", meta)
+
+
+def get_file(key: str, dest: Path) -> dict | None:
+    """Restore a cached file to `dest`. Returns its metadata ({} if none), or None on a miss."""
+    entry = _entry(key)
+    if not entry.exists():
+        return None
+    _link_or_copy(entry, dest)
+    return get_json(f"{key}.meta") or {}
+
+
+def put_json(key: str, obj):
+    data = json.dumps(obj).encode()
+    _atomic_write(_entry(key), lambda f: f.write(data))
+
+
+def get_json(key: str):
+    entry = _entry(key)
+    if not entry.exists():
+        return None
+    return json.loads(entry.read_text())
+
+
+def put_text(key: str, text: str):
+    data = text.encode("utf-8")
+    _atomic_write(_entry(key), lambda f: f.write(data))
+
+
+def get_text(key: str) -> str | None:
+    entry = _entry(key)
+    return entry.read_text(encoding="utf-8") if entry.exists() else None
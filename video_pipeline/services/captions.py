@@ -1,20 +1,30 @@
+from array import array
 from pathlib import Path
+import html
+import json
 import re
 import logging
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    import numpy as np  # imported on first use: only the as_arrays / Utterances paths need it
 
 # In local, can read from local work dir
 BASE = Path("work")
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CORPUS_PATH = BASE / "utterances.arrow"  # built by pipelines.utterance_corpus
+
 VTT_NAMES = ["captions.norm.en.vtt",
              "source.en.vtt", 
              "source.en-orig.vtt"] # there are some that have none of these
-IGNORE_PREFIXES = ('NOTE', 'STYLE', 'WEBVTT')
 
-# Regex pattern for to process the .vtt files
-TS = re.compile(r'(?P<s>\d+:\d{2}:\d{2}\.\d{3})\s*-->\s*(?P<e>\d+:\d{2}:\d{2}\.\d{3})')
+# Regex pattern for to process the .vtt files: HH:MM:SS.mmm or MM:SS.mmm on either side
+TS = re.compile(r'(?P<s>(?:\d+:)?\d{2}:\d{2}\.\d{3})\s*-->\s*(?P<e>(?:\d+:)?\d{2}:\d{2}\.\d{3})')
+TAG = re.compile(r'<[^>]*>')  # <c>, <00:00:01.500>, <v Speaker>, ...
+HAS_WORD = re.compile(r'[^\W_]')
+PARSER_VERSION = "iter_cues_v2"  # part of derived cache keys: bump when parse_vtt output changes
 
 def load_transcript(video_id: str) -> Path | None:
     """
@@ -39,25 +49,168 @@ def load_transcript(video_id: str) -> Path | None:
 
 def to_seconds(hms: str) -> float:
     """
-    Converts hours, min, seconds to seconds
+    Converts hours, min, seconds (or min, seconds) to seconds
 
     Args:
         hms::str
-            string of hours:mins:seconds
+            string of hours:mins:seconds or mins:seconds
     
     Returns
-        duration::int
+        duration::float
             Duration in seconds calculated from hms
     """
-    h, m, s = hms.split(':')
-    return int(h) * 3600 + int(m) * 60 + float(s)
+    parts = hms.split(':')
+    h = int(parts[0]) if len(parts) == 3 else 0
+    return h * 3600 + int(parts[-2]) * 60 + float(parts[-1])
+
+def iter_cues(source: Path | str | Iterable[str]) -> Iterator[Tuple[float, float, str]]:
+    """
+    Streams the cues of a WebVTT file in one pass, without reading it whole
+
+    Args:
+        source::Path | str | Iterable[str]
+            Path to a .vtt file, or its lines (e.g. an open file or str.splitlines())
+
+    Yields:
+        (start, end, text)
+            Cue times in seconds and its text, one line per caption line ("\n"-joined),
+            with inline tags stripped and entities unescaped. The header, NOTE/STYLE
+            blocks and cue identifiers are skipped, as are cues with no text.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, encoding="utf-8") as f:
+            yield from iter_cues(f)
+        return
+
+    lines, s, e = [], None, None
+    for raw in source:
+        line = raw.rstrip("\r\n")
+        if s is None:
+            # outside a cue: header, NOTE/STYLE blocks, blank lines and cue identifiers
+            m = TS.search(line)
+            if m:
+                s, e = to_seconds(m.group("s")), to_seconds(m.group("e"))
+            continue
+        if line:
+            # whitespace-only lines (YouTube auto-captions) are cue text, not terminators
+            text = html.unescape(TAG.sub("", line)).strip()
+            if text:
+                lines.append(text)
+            continue
+        # an empty line ends the cue
+        if lines:
+            yield s, e, "\n".join(lines)
+        lines, s, e = [], None, None
+    if s is not None and lines:
+        yield s, e, "\n".join(lines)
+
+def compact_cues(cues: Iterable[Tuple[float, float, str]]) -> Iterator[Tuple[float, float, str]]:
+    """
+    Drops the text rolling auto-captions carry over from the previous cue
+
+    YouTube auto-captions show each line in two or three overlapping cues: once as it is
+    spoken, in a ~10ms hold cue, then as the top line above the next one. The longest run
+    of leading lines that repeats the previous cue's trailing lines is removed, so each line
+    is yielded once, with the times of the cue it first appeared in. Cues left empty (hold
+    cues) are skipped. Captions without carried-over lines pass through unchanged.
+    """
+    prev: List[str] = []
+    for s, e, text in cues:
+        lines = text.split("\n")
+        k = min(len(lines), len(prev))
+        while k and lines[:k] != prev[-k:]:
+            k -= 1
+        prev = lines
+        if k < len(lines):
+            yield s, e, "\n".join(lines[k:])
+
+def _in_window(s: float, e: float, start_offset_sec: float, max_end_sec: Optional[float]) -> bool:
+    return not (e <= start_offset_sec or (max_end_sec is not None and s >= max_end_sec))
+
+def _utterances(cues: Iterable[Tuple[float, float, str]], start_offset_sec: float,
+                max_end_sec: Optional[float]) -> List[Dict]:
+    utts = []
+    for s, e, text in cues:
+        if _in_window(s, e, start_offset_sec, max_end_sec): # apply windowing
+            utts.append({"id": f"utt_{len(utts) + 1:06d}", "text": text.replace("\n", " "), "start": s, "end": e})
+    return utts
+
+class Utterances:
+    """
+    Struct-of-arrays utterances (parse_vtt(..., as_arrays=True)), with no per-utterance objects
+    - start, end: float64 arrays
+    - buffer: every text "\n"-joined into one str (utterance texts never contain "\n")
+    - offsets: int64, len + 1 entries; text i is buffer[offsets[i]:offsets[i + 1] - 1]
+    Indexing and iterating yield the texts, so it can stand in for a sequence of texts
+    (the segment scorers use the buffer directly)
+    """
+    __slots__ = ("start", "end", "buffer", "offsets")
+
+    def __init__(self, start: "np.ndarray", end: "np.ndarray", buffer: str, offsets: "np.ndarray"):
+        self.start = start
+        self.end = end
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_texts(cls, start, end, texts: List[str]) -> "Utterances":
+        import numpy as np
+
+        lens = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lens + 1, out=offsets[1:])  # + 1 for the separator
+        return cls(np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64),
+                   "\n".join(texts), offsets)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.buffer[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.buffer.split("\n") if len(self) else [])
+
+    def to_dicts(self) -> List[Dict]:
+        """The list-of-dicts form parse_vtt returns by default"""
+        return [{"id": f"utt_{i:06d}", "text": text, "start": s, "end": e}
+                for i, (text, s, e) in enumerate(zip(self, self.start.tolist(), self.end.tolist()), 1)]
+
+def _utterance_arrays(cues: Iterable[Tuple[float, float, str]], start_offset_sec: float,
+                      max_end_sec: Optional[float]) -> Utterances:
+    start, end, texts = array("d"), array("d"), []
+    for s, e, text in cues:
+        if _in_window(s, e, start_offset_sec, max_end_sec): # apply windowing
+            start.append(s)
+            end.append(e)
+            texts.append(text.replace("\n", " "))
+    return Utterances.from_texts(start, end, texts)
+
+def cues_to_transcript(cues: Iterable[Tuple[float, float, str]]) -> str:
+    """
+    Plain transcript from iter_cues output: caption lines in order, consecutive repeats dropped
+    (rolling auto-captions carry each line into the next cue), lines without words skipped
+    """
+    lines, last = [], None
+    for _, _, text in cues:
+        for line in text.split("\n"):
+            if line != last and HAS_WORD.search(line):
+                lines.append(line)
+            last = line
+    return " ".join(lines)
 
 def parse_vtt(
         path: Path,
         *,
         start_offset_sec: float = 0.0,
-        max_end_sec: Optional[float] = None
-) -> List[Dict]:
+        max_end_sec: Optional[float] = None,
+        compact: bool = True,
+        as_arrays: bool = False
+) -> Union[List[Dict], Utterances]:
     """
     Parses the vtt file to create a dictionary of the utterances
 
@@ -70,39 +223,78 @@ def parse_vtt(
         max_end_sec::float
             indicates what second to end at max or None
             e.g., dur_sec - 60 to skip last minute
+        compact::bool
+            Drop text carried over between rolling auto-caption cues (see compact_cues),
+            defaults to True
+        as_arrays::bool
+            Return an Utterances (parallel arrays plus one text buffer) instead of dicts,
+            much lighter for long videos, defaults to False
     
     Returns:
-        utts::List
-            A list of dictionaries containing utterance info
+        utts::List | Utterances
+            A list of dictionaries containing utterance info, or the same as an Utterances
     """
-    utts = []
-    idx = 0
-    with path.open(encoding="utf-8") as f:
-        buf = []
-        s = e = None
-        for raw in f:
-            line = raw.rstrip('\n')
-            m = TS.search(line)
-            if m:
-                # flush previous cue
-                if buf and s is not None and e is not None:
-                    if not (e <= start_offset_sec or (max_end_sec is not None and s >= max_end_sec)): # apply windowing
-                        text = " ".join(buf).strip()
-                        if text:
-                            idx += 1
-                            utts.append({"id": f"utt_{idx:06d}", "text": text, "start": s, "end": e})
-                # start a new cue
-                buf = []
-                s = to_seconds(m.group("s"))
-                e = to_seconds(m.group("e"))
-            else:
-                if line and not line.startswith(IGNORE_PREFIXES):
-                    buf.append(line)
-
-        if buf and s is not None and e is not None:
-            if not (e <= start_offset_sec or (max_end_sec is not None and s >= max_end_sec)):
-                text = " ".join(buf).strip()
-                if text:
-                    idx += 1
-                    utts.append({"id": f"utt_{idx:06d}", "text": text, "start": s, "end": e})
-    return utts
+    cues = iter_cues(path)
+    if compact:
+        cues = compact_cues(cues)
+    if as_arrays:
+        return _utterance_arrays(cues, start_offset_sec, max_end_sec)
+    return _utterances(cues, start_offset_sec, max_end_sec)
+
+def corpus_schema():
+    """Columns of the utterance corpus (pyarrow is imported on first use)"""
+    import pyarrow as pa
+    return pa.schema([
+        ("video_id", pa.string()),
+        ("start", pa.float64()),
+        ("end", pa.float64()),
+        ("text", pa.large_string()),
+        ("score", pa.float64()),
+    ])
+
+class UtteranceCorpus:
+    """
+    Read side of the utterance corpus: every video's compacted utterances (parse_vtt with no
+    window) and their scores in one uncompressed Arrow IPC file, rows grouped by video
+    - the file is memory-mapped, so opening it reads no column data and corpus-wide
+      queries page in only the columns they touch
+    - schema metadata holds the parser/scorer versions and, per video, its row range and
+      the captions hash it was built from
+    - video(video_id) is a zero-copy slice of the mapped table
+    """
+    def __init__(self, path: Path = CORPUS_PATH):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        self._source = pa.memory_map(str(self.path), "r")
+        self.table = pa.ipc.open_file(self._source).read_all()
+        meta = self.table.schema.metadata or {}
+        self.parser_version = meta.get(b"parser_version", b"").decode()
+        self.scorer = meta.get(b"scorer", b"").decode()
+        self.index: Dict[str, Dict] = json.loads(meta.get(b"index", b"{}"))
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.index
+
+    def videos(self) -> List[str]:
+        return list(self.index)
+
+    def video(self, video_id: str):
+        """pyarrow.Table of one video's utterances (video_id, start, end, text, score), no copy"""
+        entry = self.index[video_id]
+        return self.table.slice(entry["offset"], entry["length"])
+
+    def close(self):
+        self.table = None
+        self._source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_corpus(path: Path = CORPUS_PATH) -> Optional[UtteranceCorpus]:
+    """The memory-mapped utterance corpus, or None if it has not been built yet"""
+    path = Path(path)
+    return UtteranceCorpus(path) if path.exists() else None
@@ -1,15 +1,58 @@
-import os, time, json
+import os, sys, time, json, random, threading
 from decimal import Decimal
-import boto3
+from functools import lru_cache
 
 _TABLE = os.environ.get("DDB_TABLE", "interviewai-videos")
-ddb = boto3.resource("dynamodb").Table(_TABLE)
+
+@lru_cache(maxsize=None)
+def table():
+    """The videos table; boto3 is imported and the resource built on first use."""
+    import boto3
+    return boto3.resource("dynamodb", region_name=os.environ.get("AWS_REGION")).Table(_TABLE)
+
+def to_item(obj):
+    """JSON-like value as DynamoDB stores it (floats become Decimal), also for comparisons with read items"""
+    return json.loads(json.dumps(obj), parse_float=Decimal)
+
+def batch_get(keys, max_retries: int = 8) -> dict:
+    """
+    BatchGetItem over any number of (videoid, version) keys: 100 per call (the limit),
+    repeated keys sent once, UnprocessedKeys retried with full-jitter exponential backoff.
+    Returns {(videoid, version): item}; keys with no item are absent.
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+    client, name = table().meta.client, table().name
+    keys = list(dict.fromkeys(keys))
+    out = {}
+    for i in range(0, len(keys), 100):
+        request = {name: {"Keys": [{"videoid": {"S": v}, "version": {"S": ver}} for v, ver in keys[i:i + 100]]}}
+        for attempt in range(max_retries + 1):
+            resp = client.batch_get_item(RequestItems=request)
+            for raw in resp.get("Responses", {}).get(name, []):
+                item = {k: deserializer.deserialize(v) for k, v in raw.items()}
+                out[(item["videoid"], item["version"])] = item
+            request = resp.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(random.uniform(0, min(10.0, 0.1 * 2 ** attempt)))
+        else:
+            raise RuntimeError(f"BatchGetItem: keys still unprocessed after {max_retries} retries")
+    return out
+
+def read_items(video_ids, version: str) -> dict:
+    """{video_id: item} for the `version` item (e.g. "meta#v0") of each video that has one"""
+    items = batch_get((f"video#{vid}", version) for vid in video_ids)
+    return {videoid.removeprefix("video#"): item for (videoid, _), item in items.items()}
 
 def read_meta(video_id: str):
-    resp = ddb.get_item(Key={"videoid": f"video#{video_id}", "version": "meta#v0"})
+    resp = table().get_item(Key={"videoid": f"video#{video_id}", "version": "meta#v0"})
     return resp.get("Item")
 
-def write_segments_item(video_id: str, segments, scorer_version: str, pad_sec: float, notes: dict | None = None):
+def write_segments_item(video_id: str, segments, scorer_version: str, pad_sec: float, notes: dict | None = None,
+                        writer: "BatchWriter | None" = None, captions_sha: str | None = None,
+                        plan_params: dict | None = None):
     item = {
         "videoid": f"video#{video_id}",
         "version": "segments#v0",
@@ -19,13 +62,123 @@ def write_segments_item(video_id: str, segments, scorer_version: str, pad_sec: f
         "pad_sec": pad_sec,
         "segments": segments,
     }
-    item = json.loads(json.dumps(item), parse_float=Decimal)
+    # what the plan was computed from, so replanning can skip unchanged videos
+    if captions_sha:
+        item["captions_sha"] = captions_sha
+    if plan_params:
+        item["plan_params"] = plan_params
+    item = to_item(item)
     if notes:
         item["notes"] = notes
-    ddb.put_item(Item=item)
+    if writer is not None:
+        writer.put(item)
+    else:
+        table().put_item(Item=item)
 
 def read_segments(video_id: str):
-    resp = ddb.get_item(
+    resp = table().get_item(
         Key={"videoid": f"video#{video_id}", "version": "segments#v0"}
     )
     return resp.get("Item")
+
+
+class BatchWriter:
+    """
+    Buffered BatchWriteItem writer, safe to share between threads.
+    - Groups puts into calls of 25 (the BatchWriteItem limit); a repeated key in the
+      buffer replaces the earlier item since DynamoDB rejects duplicates in one batch
+    - UnprocessedItems (throttling) are retried with full-jitter exponential backoff
+    - Use as a context manager so the tail is flushed on exit
+    - With a `trace` (utils.timing.Trace), every batch sent is one "ddb_batch_write" span
+      recording the video_ids it carried
+    - `put(item, on_written=..., on_failed=...)` calls back once the item is durably written,
+      or with the exception if its batch could not be written; a failed batch is reported to
+      every item in it, and only re-raised (to whichever put/flush sent it) when some item
+      in it has no on_failed to take the error
+    """
+    MAX_BATCH = 25
+
+    def __init__(self, table, key_names=("videoid", "version"), max_retries: int = 8, trace=None):
+        from boto3.dynamodb.types import TypeSerializer
+
+        self._client = table.meta.client
+        self._table_name = table.name
+        self._key_names = key_names
+        self._max_retries = max_retries
+        self._trace = trace
+        self._serializer = TypeSerializer()
+        self._buf = {}  # key -> (request, video_id, on_written callbacks, on_failed callbacks)
+        self._lock = threading.Lock()
+
+    def put(self, item: dict, on_written=None, on_failed=None):
+        key = tuple(item[k] for k in self._key_names)
+        request = {"PutRequest": {"Item": {k: self._serializer.serialize(v) for k, v in item.items()}}}
+        with self._lock:
+            _, _, written, failed = self._buf.pop(key, (None, None, [], []))
+            if on_written:
+                written.append(on_written)
+            if on_failed:
+                failed.append(on_failed)
+            video_id = item.get("video_id") or str(key[0]).removeprefix("video#")
+            self._buf[key] = (request, video_id, written, failed)
+            batch = self._take(self.MAX_BATCH) if len(self._buf) >= self.MAX_BATCH else None
+        if batch:
+            self._send(batch)
+
+    def flush(self):
+        # keep draining past a failed batch; the first unreported error is raised at the end
+        error = None
+        while True:
+            with self._lock:
+                batch = self._take(self.MAX_BATCH)
+            if not batch:
+                break
+            try:
+                self._send(batch)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def _take(self, n: int):
+        keys = list(self._buf)[:n]
+        return [self._buf.pop(k) for k in keys]
+
+    def _send(self, batch):
+        try:
+            if self._trace is None:
+                self._write(batch)
+            else:
+                video_ids = [vid for _, vid, _, _ in batch if vid]
+                with self._trace.stage(None, "ddb_batch_write", video_ids=video_ids) as rec:
+                    rec["calls"] = self._write(batch)
+        except Exception as e:
+            print(f"BatchWriteItem: batch of {len(batch)} items failed: {e!r}", file=sys.stderr)
+            unreported = False
+            for _, _, _, failed in batch:
+                unreported |= not failed
+                for cb in failed:
+                    cb(e)
+            if unreported:
+                raise
+            return
+        for _, _, written, _ in batch:
+            for cb in written:
+                cb()
+
+    def _write(self, batch) -> int:
+        """Send one batch, retrying UnprocessedItems. Returns the number of BatchWriteItem calls."""
+        requests = [req for req, _, _, _ in batch]
+        for attempt in range(self._max_retries + 1):
+            resp = self._client.batch_write_item(RequestItems={self._table_name: requests})
+            requests = resp.get("UnprocessedItems", {}).get(self._table_name, [])
+            if not requests:
+                return attempt + 1
+            time.sleep(random.uniform(0, min(10.0, 0.1 * 2 ** attempt)))
+        raise RuntimeError(f"BatchWriteItem: {len(requests)} items still unprocessed after {self._max_retries} retries")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
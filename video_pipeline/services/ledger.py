@@ -0,0 +1,138 @@
+"""
+Ingest Ledger:
+
+Persistent per-video status for batch ingest runs, stored in SQLite under work/.
+- done / dead videos are skipped on later runs
+- failed videos keep their attempt count so retries carry over between runs
+- dead = dead-letter list, videos that used up their attempts
+- per-shard ledgers from multi-node runs are combined with `merge`
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DONE, RUNNING, FAILED, DEAD = "done", "running", "failed", "dead"
+SETTLED = (DONE, DEAD)
+# merge precedence: a more settled status wins regardless of timestamps
+_RANK = {RUNNING: 0, FAILED: 1, DEAD: 2, DONE: 3}
+_COLS = ("video_id", "status", "attempts", "last_error", "updated_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id   TEXT PRIMARY KEY,
+    status     TEXT NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at TEXT NOT NULL
+)
+"""
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class Ledger:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # one shared connection guarded by a lock; sqlite itself serializes across processes
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def get(self, video_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_id, status, attempts, last_error, updated_at FROM videos WHERE video_id = ?",
+                (video_id,),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("video_id", "status", "attempts", "last_error", "updated_at"), row))
+
+    def is_settled(self, video_id: str) -> bool:
+        rec = self.get(video_id)
+        return bool(rec) and rec["status"] in SETTLED
+
+    def mark_running(self, video_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO videos (video_id, status, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                (video_id, RUNNING, _now()),
+            )
+
+    def mark_done(self, video_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE videos SET status = ?, last_error = NULL, updated_at = ? WHERE video_id = ?",
+                (DONE, _now(), video_id),
+            )
+
+    def mark_failed(self, video_id: str, error: str, max_attempts: int) -> str:
+        """
+        Count a failed attempt. Returns the new status: FAILED (will be retried) or DEAD.
+        """
+        with self._lock, self._conn:
+            (attempts,) = self._conn.execute(
+                "SELECT attempts FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            attempts += 1
+            status = DEAD if attempts >= max_attempts else FAILED
+            self._conn.execute(
+                "UPDATE videos SET status = ?, attempts = ?, last_error = ?, updated_at = ? WHERE video_id = ?",
+                (status, attempts, error, _now(), video_id),
+            )
+        return status
+
+    def dead_letters(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id, attempts, last_error, updated_at FROM videos WHERE status = ? ORDER BY updated_at",
+                (DEAD,),
+            ).fetchall()
+        return [dict(zip(("video_id", "attempts", "last_error", "updated_at"), r)) for r in rows]
+
+    def requeue_dead(self) -> int:
+        """Give dead-lettered videos a fresh set of attempts."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE videos SET status = ?, attempts = 0, updated_at = ? WHERE status = ?",
+                (FAILED, _now(), DEAD),
+            )
+        return cur.rowcount
+
+    def merge(self, other: Path) -> int:
+        """
+        Fold another ledger (e.g. one shard's) into this one. Per video the more settled status
+        wins (done > dead > failed > running), then the newer update; attempts take the max.
+        Returns the number of videos read from `other`.
+        """
+        src = sqlite3.connect(f"file:{other}?mode=ro", uri=True)
+        try:
+            rows = [dict(zip(_COLS, r)) for r in src.execute(f"SELECT {', '.join(_COLS)} FROM videos")]
+        finally:
+            src.close()
+        with self._lock, self._conn:
+            for theirs in rows:
+                found = self._conn.execute(
+                    f"SELECT {', '.join(_COLS)} FROM videos WHERE video_id = ?", (theirs["video_id"],)
+                ).fetchone()
+                merged = theirs
+                if found:
+                    ours = dict(zip(_COLS, found))
+                    merged = max(ours, theirs, key=lambda r: (_RANK.get(r["status"], 0), r["updated_at"]))
+                    merged = {**merged, "attempts": max(ours["attempts"], theirs["attempts"])}
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO videos ({', '.join(_COLS)}) VALUES (?, ?, ?, ?, ?)",
+                    tuple(merged[c] for c in _COLS),
+                )
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
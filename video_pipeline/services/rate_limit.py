@@ -0,0 +1,136 @@
+"""
+Shared yt-dlp rate limiting:
+
+A token bucket kept in SQLite, so every ingest worker (threads, processes, parallel runs on
+the same host) draws from one request budget instead of each sleeping a fixed time.
+- rate/burst: YTDLP_RATE invocations per second (default 0.5), YTDLP_BURST tokens (default 2)
+- adaptive (AIMD): an HTTP 429 or bot check halves the shared rate and pauses everyone for
+  a cooldown; each clean call creeps the rate back toward YTDLP_RATE
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+THROTTLE_RE = re.compile(r"HTTP Error 429|Too Many Requests|confirm you.re not a bot", re.I)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name          TEXT PRIMARY KEY,
+    tokens        REAL NOT NULL,
+    rate          REAL NOT NULL,
+    updated       REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+)
+"""
+
+
+def is_throttled(output: str | None) -> bool:
+    return bool(output) and bool(THROTTLE_RE.search(output))
+
+
+class TokenBucket:
+    def __init__(self, path: Path, name: str = "yt-dlp", rate: float = 0.5, burst: float = 2.0,
+                 min_rate: float = 0.02, cooldown_sec: float = 60.0):
+        self.path, self.name = path, name
+        self.base_rate, self.burst, self.min_rate, self.cooldown_sec = rate, burst, min_rate, cooldown_sec
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._txn() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, tokens, rate, updated) VALUES (?, ?, ?, ?)",
+                (name, burst, rate, time.time()),
+            )
+
+    def _txn(self):
+        # a fresh connection per call keeps this safe across threads; BEGIN IMMEDIATE takes
+        # the write lock up front so concurrent read-modify-writes serialize
+        conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        return _Txn(conn)
+
+    def _load(self, conn, now: float):
+        tokens, rate, updated, blocked_until = conn.execute(
+            "SELECT tokens, rate, updated, blocked_until FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        # no refill while paused after a throttle
+        tokens = min(self.burst, tokens + max(0.0, now - max(updated, blocked_until)) * rate)
+        return tokens, rate, blocked_until
+
+    def _save(self, conn, tokens: float, rate: float, now: float, blocked_until: float):
+        conn.execute(
+            "UPDATE buckets SET tokens = ?, rate = ?, updated = ?, blocked_until = ? WHERE name = ?",
+            (tokens, rate, now, blocked_until, self.name),
+        )
+
+    def acquire(self, cost: float = 1.0):
+        """Block until `cost` tokens are available in the shared bucket, then take them."""
+        while True:
+            with self._txn() as conn:
+                now = time.time()
+                tokens, rate, blocked_until = self._load(conn, now)
+                if now < blocked_until:
+                    wait = blocked_until - now
+                elif tokens >= cost:
+                    self._save(conn, tokens - cost, rate, now, blocked_until)
+                    return
+                else:
+                    wait = (cost - tokens) / rate
+                self._save(conn, tokens, rate, now, blocked_until)
+            time.sleep(min(wait, 5.0))
+
+    def penalize(self):
+        """Throttled by the remote: halve the rate, drain the bucket and pause everyone."""
+        with self._txn() as conn:
+            now = time.time()
+            _, rate, blocked_until = self._load(conn, now)
+            new_rate = max(self.min_rate, rate / 2)
+            self._save(conn, 0.0, new_rate, now, max(blocked_until, now + self.cooldown_sec))
+        print(f"[rate-limit] {self.name} throttled; rate {rate:.3f}/s -> {new_rate:.3f}/s", file=sys.stderr)
+
+    def reward(self):
+        """Clean call: recover additively toward the configured rate."""
+        with self._txn() as conn:
+            now = time.time()
+            tokens, rate, blocked_until = self._load(conn, now)
+            if rate < self.base_rate:
+                self._save(conn, tokens, min(self.base_rate, rate + self.base_rate * 0.05), now, blocked_until)
+
+
+class _Txn:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+_buckets = {}
+
+
+def ytdlp_bucket() -> TokenBucket:
+    """The host-wide yt-dlp bucket (work/ratelimit.sqlite unless YTDLP_RATE_DB is set)."""
+    path = Path(os.environ.get("YTDLP_RATE_DB", "work/ratelimit.sqlite"))
+    if path not in _buckets:
+        _buckets[path] = TokenBucket(
+            path,
+            rate=float(os.environ.get("YTDLP_RATE", "0.5")),
+            burst=float(os.environ.get("YTDLP_BURST", "2")),
+        )
+    return _buckets[path]
+
+
+def report_outcome(bucket: TokenBucket, returncode: int, stderr: str | None):
+    if is_throttled(stderr):
+        bucket.penalize()
+    elif returncode == 0:
+        bucket.reward()
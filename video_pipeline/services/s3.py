@@ -0,0 +1,139 @@
+"""
+S3 helpers shared by the ingest pipelines.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+
+
+class MultipartStream:
+    """
+    Upload a byte stream to S3 as it is produced (e.g. straight from an ffmpeg pipe).
+
+    Part 1 is held back until `finish()` so the caller can patch the start of the object
+    once the full length is known (WAV/RIFF headers); S3 accepts parts in any order.
+    Later parts upload in background threads with at most `max_in_flight` outstanding.
+    """
+
+    def __init__(self, client, bucket: str, key: str, content_type: str,
+                 part_size: int = 16 * 1024 * 1024, max_in_flight: int = 4, metadata: dict | None = None):
+        self.client, self.bucket, self.key = client, bucket, key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        extra = {"Metadata": metadata} if metadata else {}
+        resp = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type, **extra)
+        self.upload_id = resp["UploadId"]
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._max_in_flight = max_in_flight
+        self._pending = set()
+        self._parts = {}
+        self._first = None  # held-back part 1
+        self._buf = bytearray()
+        self._next_part = 1
+        self._closed = False  # completed or aborted
+
+    def _upload_part(self, number: int, body: bytes):
+        resp = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=body
+        )
+        self._parts[number] = resp["ETag"]
+
+    def _flush_part(self, body: bytes):
+        number = self._next_part
+        self._next_part += 1
+        if number == 1:
+            self._first = bytearray(body)
+            return
+        while len(self._pending) >= self._max_in_flight:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                fut.result()
+        self._pending.add(self._pool.submit(self._upload_part, number, body))
+
+    def write(self, data: bytes):
+        self._buf += data
+        while len(self._buf) >= self.part_size:
+            self._flush_part(bytes(self._buf[:self.part_size]))
+            del self._buf[:self.part_size]
+
+    def finish(self, head: bytes = b""):
+        """Upload the remaining bytes, then part 1 with `head` written over its start."""
+        try:
+            if self._buf or self._next_part == 1:
+                self._flush_part(bytes(self._buf))
+                self._buf.clear()
+            for fut in self._pending:
+                fut.result()
+            first = self._first
+            first[:len(head)] = head
+            self._upload_part(1, bytes(first))
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": n, "ETag": self._parts[n]} for n in sorted(self._parts)]},
+            )
+            self._closed = True
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._pool.shutdown(wait=False)
+
+    def abort(self):
+        """
+        Abort the upload. Safe to call more than once (finish() already aborts on failure,
+        and callers' own error handling may abort again): only the first call reaches S3,
+        and an upload S3 no longer knows (NoSuchUpload) counts as aborted.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        from botocore.exceptions import ClientError
+
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+
+
+class PrefixIndex:
+    """
+    Existence/size index for every object under a prefix, built with one paginated
+    list_objects_v2 (1000 keys per call) instead of a head_object per artifact.
+    """
+
+    def __init__(self, client, bucket: str, prefix: str):
+        self._lock = threading.Lock()
+        self._sizes = {}
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                self._sizes[obj["Key"]] = obj["Size"]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sizes
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def size(self, key: str) -> int | None:
+        return self._sizes.get(key)
+
+    def add(self, key: str, size: int):
+        with self._lock:
+            self._sizes[key] = size
+
+
+def transfer_config():
+    """Multipart settings for large artifacts (audio), tunable via env."""
+    from boto3.s3.transfer import TransferConfig
+
+    mb = 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", "8")) * mb,
+        multipart_chunksize=int(os.environ.get("S3_MULTIPART_CHUNK_MB", "16")) * mb,
+        max_concurrency=int(os.environ.get("S3_MAX_CONCURRENCY", "10")),
+        use_threads=True,
+    )
@@ -0,0 +1,205 @@
+"""
+Work-dir budget:
+
+Keeps work/ under a byte budget by evicting the least-recently-used artifacts that are
+already safely in S3.
+- stages record what they uploaded in work/<video_id>/.uploaded.json (rel path -> S3 key,
+  size, mtime); a file is evictable only while it still matches that record, and the record
+  keeps the key so `restore_evicted` can fetch an evicted file back from S3
+- content-addressed cache entries (work/.cas) are evictable too: they can be recomputed
+- a video whose work/<video_id>/.lock is held (pipeline stages still running) is pinned
+- files under `min_bytes` stay: captions and json are tiny and later stages read them locally
+- usage counts each inode once, so files hard-linked into .cas are not double counted, and
+  evicting a linked file only frees space once every link to it is gone
+"""
+
+import json
+import os
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from video_pipeline.services.cache import CAS_ROOT
+from video_pipeline.utils.file_utils import dir_lock
+
+UPLOADED = ".uploaded.json"
+
+
+def read_uploaded(vdir: Path) -> dict:
+    try:
+        return json.loads((vdir / UPLOADED).read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_uploaded(vdir: Path, manifest: dict):
+    tmp = vdir / f".tmp-{UPLOADED}"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, vdir / UPLOADED)
+
+
+def record_uploaded(vdir: Path, entries):
+    """
+    Record (path, s3 key) pairs that are now in S3. Call while holding the video's dir_lock,
+    like every other per-video write.
+    """
+    manifest = read_uploaded(vdir)
+    for path, key in entries:
+        if not path or not path.exists():
+            continue
+        st = path.stat()
+        manifest[str(path.relative_to(vdir))] = {"key": key, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    _write_uploaded(vdir, manifest)
+
+
+def restore_evicted(vdir: Path, rel: str, client=None, bucket: str | None = None) -> Path | None:
+    """
+    vdir/rel, downloaded again from its recorded S3 key if the budget evicted it.
+    Returns None when the file is missing and was never recorded as uploaded.
+    `client` defaults to a boto3 S3 client, `bucket` to $S3_BUCKET.
+    """
+    path = vdir / rel
+    if path.exists():
+        return path
+    with dir_lock(vdir):
+        if path.exists():
+            return path
+        manifest = read_uploaded(vdir)
+        rec = manifest.get(rel)
+        if not rec:
+            return None
+        bucket = bucket or os.environ["S3_BUCKET"]
+        if client is None:
+            import boto3
+            client = boto3.client("s3", region_name=os.environ.get("AWS_REGION", "us-east-1"))
+        tmp = path.with_name(f".tmp-{path.name}")
+        client.download_file(Bucket=bucket, Key=rec["key"], Filename=str(tmp))
+        os.replace(tmp, path)
+        # matches its record again, so it can be evicted again later
+        st = path.stat()
+        manifest[rel] = {"key": rec["key"], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        _write_uploaded(vdir, manifest)
+    print(f"[workdir] restored {path} from s3://{bucket}/{rec['key']}")
+    return path
+
+
+def _last_used(st: os.stat_result) -> float:
+    # atime may be coarse (relatime) or off (noatime); a rewrite also counts as a use
+    return max(st.st_atime, st.st_mtime)
+
+
+class WorkDirBudget:
+    def __init__(self, root: Path, budget_bytes: int, min_bytes: int = 1024 * 1024,
+                 min_age_sec: float = 600.0, cas_root: Path = CAS_ROOT):
+        self.root, self.budget_bytes = root, budget_bytes
+        self.min_bytes, self.min_age_sec, self.cas_root = min_bytes, min_age_sec, cas_root
+        self._lock = threading.Lock()
+
+    def _scan(self) -> tuple[int, dict]:
+        """Bytes used under root (each inode once) and {(dev, ino): remaining links}."""
+        used, links = 0, {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    st = os.lstat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                ino = (st.st_dev, st.st_ino)
+                if ino not in links:
+                    links[ino] = st.st_nlink
+                    used += st.st_size
+        return used, links
+
+    def _candidates(self) -> list[tuple[float, Path, Path | None, os.stat_result]]:
+        """(last used, path, owning video dir or None for cache entries, stat), oldest first."""
+        found = []
+        for vdir in self.root.iterdir():
+            if not vdir.is_dir() or vdir.name.startswith("."):
+                continue
+            for rel, rec in read_uploaded(vdir).items():
+                path = vdir / rel
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_size == rec["size"] and st.st_mtime_ns == rec["mtime_ns"]:
+                    found.append((_last_used(st), path, vdir, st))
+        if self.cas_root.exists():
+            for path in self.cas_root.glob("*/*"):
+                if path.name.endswith(".meta") or path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    found.append((_last_used(path.stat()), path, None, path.stat()))
+                except FileNotFoundError:
+                    continue
+        cutoff = time.time() - self.min_age_sec
+        return sorted((c for c in found if c[0] < cutoff and c[3].st_size >= self.min_bytes), key=lambda c: c[0])
+
+    def enforce(self) -> int:
+        """Evict until usage fits the budget. Returns bytes freed (0 if another call is running)."""
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._enforce()
+        finally:
+            self._lock.release()
+
+    def _enforce(self) -> int:
+        used, links = self._scan()
+        if used <= self.budget_bytes:
+            return 0
+        freed, evicted, pinned = 0, 0, set()
+        for _, path, vdir, st in self._candidates():
+            if used - freed <= self.budget_bytes:
+                break
+            if vdir in pinned:
+                continue
+            if vdir is None:
+                path.unlink(missing_ok=True)
+                path.with_name(f"{path.name}.meta").unlink(missing_ok=True)
+            else:
+                with dir_lock(vdir, blocking=False) as acquired:
+                    if not acquired:
+                        pinned.add(vdir)
+                        continue
+                    path.unlink(missing_ok=True)
+                    manifest = read_uploaded(vdir)
+                    manifest.get(str(path.relative_to(vdir)), {})["evicted_at"] = time.time()
+                    _write_uploaded(vdir, manifest)
+            evicted += 1
+            ino = (st.st_dev, st.st_ino)
+            links[ino] = links.get(ino, 1) - 1
+            if links[ino] <= 0:
+                freed += st.st_size
+        print(f"[workdir] {used / 1e9:.2f} GB used, budget {self.budget_bytes / 1e9:.2f} GB: "
+              f"evicted {evicted} files, freed {freed / 1e9:.2f} GB"
+              + (f", {len(pinned)} videos pinned" if pinned else ""))
+        if used - freed > self.budget_bytes:
+            print("[workdir] still over budget: remaining files are not in S3 yet or in use")
+        return freed
+
+    @contextmanager
+    def watching(self, interval_sec: float = 30.0):
+        """Enforce the budget now and then every `interval_sec` in a background thread."""
+        stop = threading.Event()
+
+        def loop():
+            while True:
+                try:
+                    self.enforce()
+                except OSError as e:
+                    print(f"[workdir] eviction pass failed: {e!r}")
+                if stop.wait(interval_sec):
+                    return
+
+        thread = threading.Thread(target=loop, name="workdir-budget", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
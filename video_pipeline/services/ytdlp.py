@@ -0,0 +1,152 @@
+"""
+In-process yt-dlp:
+
+yt_dlp.YoutubeDL used as a library instead of one CLI process per call.
+- One YoutubeDL per (Downloader, thread), reused across videos: no interpreter start-up
+  or extractor setup per download
+- fetch() extracts the page once and downloads everything the options ask for (media,
+  subtitles, info json) from that single result; process() runs another set of options
+  (e.g. subtitles only) over an info dict a fetch already returned, without re-extracting
+- every extraction draws from the shared token bucket (services.rate_limit); a 429 or
+  bot check slows every worker down
+- yt_dlp itself is imported on the first download, not when this module is imported
+- errors yt-dlp only logs (ignoreerrors="only_download") still fail the fetch: the
+  download return code is checked after every fetch and the logged errors are raised
+"""
+
+import copy
+import sys
+import threading
+
+from video_pipeline.services.rate_limit import TokenBucket, report_outcome, ytdlp_bucket
+
+
+class DownloadError(Exception):
+    """A yt-dlp extraction/download failure (wraps yt_dlp.utils.DownloadError)."""
+
+
+class _ErrorLog:
+    """yt-dlp logger: warnings/errors go to stderr, and each thread's errors are kept for its fetch"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self) -> list[str]:
+        self._local.errors = []
+        return self._local.errors
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        print(msg, file=sys.stderr)
+
+    def error(self, msg):
+        print(msg, file=sys.stderr)
+        errors = getattr(self._local, "errors", None)
+        if errors is not None:
+            errors.append(msg)
+
+
+class Downloader:
+    """
+    A set of yt-dlp options (same keys as YoutubeDL params) plus a per-thread YoutubeDL.
+    Output templates should be video-relative (e.g. work/%(id)s/source.%(ext)s) so one
+    instance serves every video.
+    """
+
+    def __init__(self, **params):
+        self._log = _ErrorLog()
+        self.params = {"quiet": True, "noprogress": True, "logger": self._log, **params}
+        self._local = threading.local()
+
+    def _ydl(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            from yt_dlp import YoutubeDL
+            ydl = self._local.ydl = YoutubeDL(self.params)
+        return ydl
+
+    def fetch(self, url: str, bucket: TokenBucket | None = None) -> dict:
+        """
+        Extract once, download what the options ask for, return the processed info dict.
+        Raises DownloadError when yt-dlp raised or when a download failed without raising
+        (ignoreerrors), e.g. a truncated media file.
+        """
+        return self._run(
+            lambda ydl: ydl.process_ie_result(ydl.extract_info(url, download=False, process=False), download=True),
+            url, bucket,
+        )
+
+    def process(self, info: dict, bucket: TokenBucket | None = None) -> dict:
+        """
+        Like fetch, but from an info dict another Downloader's fetch already returned: no
+        second extraction, only the downloads this instance's options ask for (e.g. subtitles).
+        """
+        return self._run(lambda ydl: ydl.process_ie_result(copy.deepcopy(info), download=True),
+                         info.get("webpage_url") or info.get("id"), bucket)
+
+    def _run(self, work, what: str, bucket: TokenBucket | None) -> dict:
+        from yt_dlp.utils import DownloadError as YtDlpError
+
+        bucket = bucket or ytdlp_bucket()
+        ydl = self._ydl()
+        errors = self._log.reset()
+        ydl._download_retcode = 0  # sticky on a reused YoutubeDL
+        bucket.acquire()
+        try:
+            info = work(ydl)
+        except YtDlpError as e:
+            report_outcome(bucket, 1, str(e))
+            raise DownloadError(str(e)) from e
+        if ydl._download_retcode:
+            message = "\n".join(errors) or f"download failed for {what}"
+            report_outcome(bucket, 1, message)
+            raise DownloadError(message)
+        report_outcome(bucket, 0, None)
+        return ydl.sanitize_info(info)
+
+
+def cookie_params(cookies_file: str | None, browser: str) -> dict:
+    """Explicit cookies.txt beats browser extraction."""
+    if cookies_file:
+        return {"cookiefile": cookies_file}
+    return {"cookiesfrombrowser": (browser,)}
+
+
+def probe_from_info(info: dict | None) -> dict | None:
+    """
+    ffprobe-style summary of the downloaded format, built from the yt-dlp info dict.
+    None when yt-dlp did not report enough (audio codec, duration) to stand in for ffprobe.
+    """
+    if not info or not info.get("duration") or info.get("acodec") in (None, "none"):
+        return None
+    streams = [{
+        "codec_type": "audio",
+        "codec_name": info["acodec"],
+        "sample_rate": info.get("asr"),
+        "channels": info.get("audio_channels"),
+    }]
+    if info.get("vcodec") not in (None, "none"):
+        streams.append({
+            "codec_type": "video",
+            "codec_name": info["vcodec"],
+            "width": info.get("width"),
+            "height": info.get("height"),
+            "avg_frame_rate": info.get("fps"),
+        })
+    tbr = info.get("tbr")
+    return {
+        "format": {
+            "format_name": info.get("ext"),
+            "format_id": info.get("format_id"),
+            "duration": info["duration"],
+            "size": info.get("filesize") or info.get("filesize_approx"),
+            "bit_rate": int(tbr * 1000) if tbr else None,
+        },
+        "streams": streams,
+        "probe_source": "yt-dlp",
+    }
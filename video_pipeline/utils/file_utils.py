@@ -1,4 +1,7 @@
+from contextlib import contextmanager
 from pathlib import Path
+import fcntl
+import hashlib
 import os
 
 def to_abs_path(value: str, base: Path) -> Path:
@@ -8,4 +11,31 @@ def to_abs_path(value: str, base: Path) -> Path:
     - If relative, resolves relative to `base`
     """
     p = Path(os.path.expandvars(value)).expanduser()
-    return p if p.is_absolute() else (base / p).resolve()
\ No newline at end of file
+    return p if p.is_absolute() else (base / p).resolve()
+
+def sha256_of(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1<<20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+@contextmanager
+def dir_lock(path: Path, blocking: bool = True):
+    """
+    Hold an exclusive advisory lock on a directory (via `<path>/.lock`).
+    - Safe across threads and processes on the same host
+    - Yields True if the lock was acquired, False if `blocking` is off and it is held elsewhere
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / ".lock", "a+") as fh:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(fh.fileno(), flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
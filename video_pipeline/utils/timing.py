@@ -0,0 +1,81 @@
+"""
+Per-stage timing trace:
+
+Each timed stage appends one JSON line {video_id, stage, sec, bytes, ts} (plus any extra
+fields the caller passes, e.g. video_ids for a batched write) to a trace file,
+and `report()` summarizes a trace as p50/p95/max seconds and MB/s per stage.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Trace:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, video_id: str | None, stage: str, sec: float, nbytes: int | None = None, **fields):
+        line = json.dumps({
+            "video_id": video_id,
+            "stage": stage,
+            "sec": round(sec, 6),
+            "bytes": nbytes,
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            **fields,
+        })
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as f:
+                f.write(line + "\n")
+
+    @contextmanager
+    def stage(self, video_id: str | None, stage: str, nbytes: int | None = None, **fields):
+        """
+        Time the enclosed block. Yields a dict; set rec["bytes"] inside the block when the
+        size is only known afterwards (other keys set there are recorded as extra fields).
+        Nothing is recorded if the block raises.
+        """
+        rec = {"bytes": nbytes}
+        t0 = time.perf_counter()
+        yield rec
+        sec = time.perf_counter() - t0
+        self.record(video_id, stage, sec, rec.pop("bytes"), **fields, **rec)
+
+
+def _pct(sorted_vals: list[float], p: float) -> float:
+    # nearest-rank percentile
+    return sorted_vals[max(0, math.ceil(p / 100 * len(sorted_vals)) - 1)]
+
+
+def report(path: Path) -> str:
+    by_stage = defaultdict(list)
+    bytes_by_stage = defaultdict(int)
+    sec_with_bytes = defaultdict(float)
+    with path.open() as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            by_stage[rec["stage"]].append(rec["sec"])
+            if rec.get("bytes"):
+                bytes_by_stage[rec["stage"]] += rec["bytes"]
+                sec_with_bytes[rec["stage"]] += rec["sec"]
+
+    rows = [f"{'stage':<36}{'n':>7}{'p50 s':>10}{'p95 s':>10}{'max s':>10}{'total s':>11}{'MB/s':>9}"]
+    # biggest total time first: that is where parallelism pays off
+    for stage, secs in sorted(by_stage.items(), key=lambda kv: -sum(kv[1])):
+        secs.sort()
+        mbps = ""
+        if sec_with_bytes[stage] > 0:
+            mbps = f"{bytes_by_stage[stage] / 1e6 / sec_with_bytes[stage]:.1f}"
+        rows.append(
+            f"{stage:<36}{len(secs):>7}{_pct(secs, 50):>10.2f}{_pct(secs, 95):>10.2f}"
+            f"{secs[-1]:>10.2f}{sum(secs):>11.1f}{mbps:>9}"
+        )
+    return "\n".join(rows)